@@ -0,0 +1,347 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import datetime
+import subprocess
+import PIL
+from PIL import Image, ImageDraw
+from modules.card_create import ProductCardGenerator
+from modules.page_generator import A4PageGenerator
+from modules.card_layouts import CardLayoutManager, select_layout
+from modules.encoder import OutputEncoder, IMAGE_FORMATS
+from modules.settings import load_settings
+from modules.csv_source import read_csv
+
+# sample_csv/ と同じ列構成
+CSV_HEADER = ["item_code", "image_path", "product_name", "color_jp", "color_en", "page_product_name", "ページ枚数"]
+CATALOG_SIZES = (100, 1000, 10000)
+
+# 合成する元画像のサイズと形式（モード, 保存形式, 拡張子）
+SOURCE_SIZES = ((800, 600), (1200, 1800), (1600, 1600), (3000, 2000), (4000, 3000))
+# I;16 は16bitグレースケール+透過色（tRNS）のPNG（描画用の変換が壊れていないかもここで確かめる）
+SOURCE_KINDS = (("RGB", "JPEG", ".jpg"), ("RGBA", "PNG", ".png"), ("CMYK", "JPEG", ".jpg"), ("I;16", "PNG", ".png"))
+
+COLORS = [("ブラック", "BLACK"), ("ホワイト", "WHITE"), ("レッド", "RED"), ("ネイビー", "NAVY"),
+          ("グレー", "GRAY"), ("ベージュ", "BEIGE"), ("グリーン", "GREEN"), ("ブラウン", "BROWN")]
+
+# 計測する段階（表示順）
+STAGES = ("csv_read", "decode", "fit_to_rect", "text", "encode", "create_a4_page", "log_write")
+STAGE_NOTES = {
+    "csv_read": "read_csv でカタログ全行を読む（1行単位）",
+    "decode": "元画像のデコードと正規化（_normalize_image、draft含む）",
+    "fit_to_rect": "fit_to_rect（フル・ハーフ各1回）",
+    "text": "create_card（商品画像の貼り付け+テキスト描画）",
+    "encode": "OutputEncoder.save（フル・ハーフ各1回、減色含む）",
+    "create_a4_page": "A4PageGenerator.create_a4_page（1ページ単位）",
+    "log_write": "save_log でカード作成ログを書き出す（1行単位）",
+}
+
+def make_source_image(rng, size, mode):
+    """グラデーションと図形を重ねた元画像を作る（乱数で内容を変える）"""
+    gradient = Image.linear_gradient('L').rotate(rng.randrange(360)).resize(size)
+    image = Image.merge('RGB', (gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT),
+                                Image.new('L', size, rng.randrange(256))))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(size[0] // 2), y0 + rng.randrange(size[1] // 2)
+        draw.ellipse((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+    if mode in ("RGBA", "I;16"):
+        # 商品の切り抜き画像のように周囲を透明にする
+        alpha = Image.new('L', size, 0)
+        ImageDraw.Draw(alpha).ellipse((size[0] // 10, size[1] // 10, size[0] * 9 // 10, size[1] * 9 // 10), fill=255)
+    if mode == "RGBA":
+        image.putalpha(alpha)
+        return image
+    if mode == "I;16":
+        # 0〜65535 に広げたグレー（0 は使わない）の周囲を透過色 0 で塗る
+        wide = image.convert('L').convert('I').point(lambda v: v * 257 + 1)
+        wide.paste(0, mask=alpha.point(lambda v: 255 - v))
+        wide.info["transparency"] = 0
+        return wide
+    return image.convert(mode)
+
+def make_source_images(image_dir, count, seed):
+    """サイズ・モードを混ぜた元画像を count 枚作り、パスのリストを返す"""
+    os.makedirs(image_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        size = SOURCE_SIZES[i % len(SOURCE_SIZES)]
+        mode, pil_format, ext = SOURCE_KINDS[i % len(SOURCE_KINDS)]
+        path = os.path.join(image_dir, f"src_{i:04d}_{mode.replace(';', '')}_{size[0]}x{size[1]}{ext}")
+        if not os.path.exists(path):
+            make_source_image(rng, size, mode).save(path, pil_format)
+        paths.append(path)
+    return paths
+
+def make_catalog(csv_path, rows, image_paths, seed):
+    """rows 行の合成カタログを sample_csv と同じ列構成・Shift_JIS で書き出す"""
+    rng = random.Random(seed + rows)
+    with open(csv_path, 'w', encoding='cp932', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        written = 0
+        page = 0
+        while written < rows:
+            # 1ページ1〜8枚（配置パターンがある枚数）
+            count = min(rng.randint(1, 8), rows - written)
+            page_name = f"商品{page:05d}"
+            for color_jp, color_en in rng.sample(COLORS, count):
+                image_path = image_paths[written % len(image_paths)]
+                writer.writerow([str(10000 + written), image_path, page_name, color_jp, color_en, page_name, str(count)])
+                written += 1
+            page += 1
+
+class StageTimer:
+    """段階ごとの所要時間（1件ごと）を集める"""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def measure(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples[stage].append(time.perf_counter() - start)
+        return result
+
+    def add(self, stage, seconds, count=1):
+        # まとめて計測した時間を件数で割って記録する
+        self.samples[stage].extend([seconds / count] * count)
+
+    def summary(self):
+        return {stage: summarize(samples) for stage, samples in self.samples.items() if samples}
+
+def summarize(samples):
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        "count": len(ordered),
+        "total_s": round(total, 4),
+        "mean_ms": round(total / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(0.5), 3),
+        "p95_ms": round(percentile(0.95), 3),
+        "per_sec": round(len(ordered) / total, 2) if total else None,
+    }
+
+# 起動時間を計るコマンド（リポジトリ直下で実行）
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_COMMANDS = {
+    "cli_help": ["create_all.py", "--help"],
+    "worker_import": ["-c", "import modules.card_create"],
+    "python": ["-c", "pass"],
+}
+
+def measure_startup(repeat=5):
+    """CLIの起動とワーカーが読み込むモジュールの読み込み時間（repeat回の最小値、ミリ秒）"""
+    startup = {}
+    for name, command in STARTUP_COMMANDS.items():
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + command, cwd=REPO_DIR, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        startup[name] = round(min(times) * 1000, 1)
+    return startup
+
+def check_startup(startup, budget_ms):
+    """起動時間の予算を超えたコマンドを返す（Python自体の起動時間は含めない）"""
+    over = []
+    for name, elapsed in startup.items():
+        if name == "python":
+            continue
+        mark = "  ← 予算超過" if elapsed > budget_ms else ""
+        print(f"  {name:<16} {elapsed:>8.1f}ms（予算 {budget_ms:.0f}ms）{mark}")
+        if elapsed > budget_ms:
+            over.append({"catalog": "startup", "stage": name, "budget_ms": budget_ms, "current_ms": elapsed})
+    return over
+
+def run_catalog(csv_path, work_dir, encoder, limit=None):
+    """1つのカタログについて各段階を計測する"""
+    timer = StageTimer()
+    generator = ProductCardGenerator(encoder=encoder, preview_scales=())
+    page_generator = A4PageGenerator()
+    layout_manager = CardLayoutManager()
+    card_dir = os.path.join(work_dir, "card")
+    os.makedirs(card_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    header, rows = read_csv(csv_path)
+    data_rows = list(rows)
+    timer.add("csv_read", time.perf_counter() - start, len(data_rows))
+
+    full_box = generator.card_specs["full"].image_size
+    half_box = generator.card_specs["half"].image_size
+    log_rows = [header + ["ステータス", "エラーログ"]]
+    page_name = None
+    page_cards = []
+
+    def flush_page():
+        if not page_cards:
+            return
+        _, layout = select_layout(layout_manager.get_layouts_for_count(len(page_cards)))
+        cards = [
+            {'image': cards_by_size[size], 'x': pos[0], 'y': pos[1]}
+            for cards_by_size, pos, size in zip(page_cards, layout.positions, layout.sizes)
+        ]
+        timer.measure("create_a4_page", page_generator.create_a4_page, cards, page_name)
+        page_cards.clear()
+
+    target_rows = data_rows[:limit] if limit else data_rows
+    for i, row in enumerate(target_rows):
+        item_code, image_path, product_name, color_jp, color_en, page_product_name = row[:6]
+        if page_product_name != page_name:
+            flush_page()
+            page_name = page_product_name
+
+        image = Image.open(image_path)
+        intermediate = timer.measure("decode", generator._normalize_image, image, *full_box)
+        start = time.perf_counter()
+        fitted = {
+            "full": generator.fit_to_rect(intermediate, *full_box),
+            "half": generator.fit_to_rect(intermediate, *half_box),
+        }
+        timer.samples["fit_to_rect"].append(time.perf_counter() - start)
+
+        cards = {}
+        for size in ("full", "half"):
+            cards[size] = timer.measure("text", generator.create_card, image_path, product_name, color_jp,
+                                        color_en, item_code, size=size, product_image=fitted[size])
+        start = time.perf_counter()
+        for size, card in cards.items():
+            # 保存先は1つを使い回す（ディスク容量を食わないように）
+            generator.encoder.save(card, os.path.join(card_dir, f"card_{size}{generator.encoder.extension}"),
+                                   quantize=True)
+        timer.samples["encode"].append(time.perf_counter() - start)
+        page_cards.append(cards)
+        log_rows.append(row + ["正常", ""])
+        if (i + 1) % 100 == 0:
+            print(f"  {i + 1}/{len(target_rows)} 行")
+    flush_page()
+
+    # ログはカタログ全行分を書き出す
+    log_rows.extend(row + ["正常", ""] for row in data_rows[len(target_rows):])
+    start = time.perf_counter()
+    generator.save_log(log_rows, os.path.join(work_dir, "log"))
+    timer.add("log_write", time.perf_counter() - start, len(log_rows))
+    return {"rows": len(data_rows), "rendered_rows": len(target_rows), "stages": timer.summary()}
+
+def compare(results, baseline, threshold=0.10, min_delta_ms=0.5):
+    """ベースラインと平均時間を比べ、threshold（割合）以上遅くなった段階を返す"""
+    regressions = []
+    print(f"\n{'カタログ':>8} {'段階':<16} {'基準ms':>10} {'今回ms':>10} {'変化':>8}")
+    for catalog, current in results["catalogs"].items():
+        base = baseline.get("catalogs", {}).get(catalog)
+        if base is None:
+            continue
+        for stage in STAGES:
+            if stage not in current["stages"] or stage not in base["stages"]:
+                continue
+            before = base["stages"][stage]["mean_ms"]
+            after = current["stages"][stage]["mean_ms"]
+            ratio = after / before if before else 1.0
+            regressed = ratio > 1 + threshold and after - before > min_delta_ms
+            mark = "  ← 遅くなりました" if regressed else ""
+            print(f"{catalog:>8} {stage:<16} {before:>10.2f} {after:>10.2f} {ratio - 1:>+8.1%}{mark}")
+            if regressed:
+                regressions.append({"catalog": catalog, "stage": stage, "baseline_ms": before,
+                                    "current_ms": after, "ratio": round(ratio, 3)})
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="合成カタログでカード・ページ生成の各段階の速度を計測する")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(CATALOG_SIZES),
+                        help="カタログの行数（複数指定可）")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="描画・エンコードを計測する行数の上限（CSV読み込みとログ書き出しは全行）")
+    parser.add_argument("--image-pool", type=int, default=48, help="合成する元画像の枚数（行は順に使い回す）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--settings", default=None, help="settings.json のパス")
+    parser.add_argument("--image-format", choices=sorted(IMAGE_FORMATS), default=None,
+                        help="保存形式（settings.json の image_format を上書き）")
+    parser.add_argument("--work-dir", default=None, help="合成画像・出力の作業フォルダ（省略時は一時フォルダ）")
+    parser.add_argument("--output", default="benchmark_result.json", help="結果のJSONの保存先")
+    parser.add_argument("--baseline", default=None, help="比較するベースラインのJSON")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="この割合以上遅くなった段階を劣化として扱う（既定 0.10 = 10%%）")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5,
+                        help="差がこのミリ秒未満なら劣化として扱わない（計測誤差よけ）")
+    parser.add_argument("--startup-budget-ms", type=float, default=300,
+                        help="CLIの起動・ワーカーのモジュール読み込みにかけてよい時間（ミリ秒）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = load_settings(args.settings)
+    if args.image_format:
+        settings["image_format"] = args.image_format
+    encoder = OutputEncoder.from_settings(settings)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="pop_bench_")
+    keep_work_dir = args.work_dir is not None
+    try:
+        print(f"元画像を作成しています: {args.image_pool}枚")
+        image_paths = make_source_images(os.path.join(work_dir, "images"), args.image_pool, args.seed)
+
+        results = {
+            "meta": {
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "pillow": PIL.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "image_format": encoder.image_format,
+                "encoder": encoder.settings(),
+                "seed": args.seed,
+                "limit": args.limit,
+                "stage_notes": STAGE_NOTES,
+            },
+            "catalogs": {},
+        }
+        for rows in args.sizes:
+            print(f"カタログ {rows}行 を計測しています")
+            catalog_dir = os.path.join(work_dir, f"catalog_{rows}")
+            os.makedirs(catalog_dir, exist_ok=True)
+            csv_path = os.path.join(catalog_dir, "catalog.csv")
+            make_catalog(csv_path, rows, image_paths, args.seed)
+            results["catalogs"][str(rows)] = run_catalog(csv_path, catalog_dir, encoder, args.limit)
+
+        for catalog, result in results["catalogs"].items():
+            print(f"\nカタログ {catalog}行（計測 {result['rendered_rows']}行）")
+            for stage, stats in result["stages"].items():
+                print(f"  {stage:<16} 平均 {stats['mean_ms']:>9.2f}ms  p95 {stats['p95_ms']:>9.2f}ms  "
+                      f"{stats['count']}件 {stats['total_s']:.2f}秒")
+
+        print("\n起動時間")
+        results["startup"] = measure_startup()
+        regressions = check_startup(results["startup"], args.startup_budget_ms)
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            regressions += compare(results, baseline, args.threshold, args.min_delta_ms)
+            results["baseline"] = {"path": args.baseline, "threshold": args.threshold, "regressions": regressions}
+
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n計測結果を保存しました: {args.output}")
+        if regressions:
+            print(f"ベースラインより遅くなった段階が {len(regressions)} 件あります")
+            return 1
+        return 0
+    finally:
+        if not keep_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,142 @@
 import os
-import csv
+import sys
+import argparse
 import datetime
-from modules.card_create import ProductCardGenerator
-from modules.page_create import PageCreator
-import tkinter as tk
-from tkinter import filedialog
-import chardet
-
-def detect_encoding(file_path):
-    with open(file_path, 'rb') as f:
-        raw_data = f.read()
-    result = chardet.detect(raw_data)
-    return result['encoding']
-
-def main():
-    # CSVファイルを1回だけ選択
-    csv_path = filedialog.askopenfilename(title="CSVファイルを選択", filetypes=[("CSV files", "*.csv")])
-    if not csv_path:
+# 引数の解析に必要な軽いモジュールだけを先に読み込む（Pillowや生成処理は main() の中で読み込む）
+from modules.encoder import IMAGE_FORMATS
+from modules.card_layouts import PATTERN_RULES
+from modules.timing import parse_row_range
+from modules.image_mirror import IMAGE_MIRROR_DIRNAME
+from modules.pipeline import peak_rss_bytes, format_peak_rss
+from modules.run_journal import RUN_JOURNAL_FILENAME
+from modules.sharding import parse_shard
+
+def gui_available():
+    """配置画面（tkinter）を表示できる環境かどうか"""
+    try:
+        import tkinter
+    except ImportError:
+        return False
+    if sys.platform in ("win32", "darwin"):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="商品カードとA4ページを一括生成します")
+    parser.add_argument("--csv", help="入力CSVファイル（省略時はダイアログで選択）")
+    parser.add_argument("--output", help="保存先フォルダ（省略時はダイアログで選択）")
+    parser.add_argument("--settings", default=None,
+                        help="設定ファイル（省略時はリポジトリ直下の settings.json）")
+    parser.add_argument("--image-format", choices=sorted(IMAGE_FORMATS), default=None,
+                        help="カード・ページの保存形式（settings.json の image_format を上書き）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="カード生成のプロセス数（省略時はCPU数、1で逐次処理）")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="カード・ページ生成でワーカーに同時に投入する行・ページ数の上限（省略時はプロセス数の2倍）")
+    parser.add_argument("--image-cache-mb", type=int, default=2048,
+                        help="元画像キャッシュの上限（MB、カード生成の全プロセスの合計。プロセス数で等分する）")
+    parser.add_argument("--force", action="store_true",
+                        help="レンダーキャッシュ・ページマニフェストを使わず全カード・全ページを再生成する")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"前回中断した実行の続きから処理する（出力先/{RUN_JOURNAL_FILENAME} に完了と記録され、"
+                             "出力ファイルが残っているカード・ページは作り直さない）")
+    parser.add_argument("--retry-failures", default=None, metavar="カード作成ログ",
+                        help="前回の *_card_create_log.csv でエラーになった行だけを作り直し、結果をまとめた新しいログを書き出す"
+                             "（--csv の代わりに指定する）")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="i/N",
+                        help="ページ商品名ごとにN分割したうちi番目（1始まり）のカード・ページだけを生成し、"
+                             "シャード名付きのログを書き出す（ヘッドレスで実行）")
+    parser.add_argument("--merge-shards", default=None, metavar="ログフォルダ",
+                        help="ログフォルダにあるシャードごとのログを元の行順で1つのカード・ページ作成ログにまとめて終了する")
+    parser.add_argument("--hash-images", action="store_true",
+                        help="元画像・カード画像の変更判定にサイズ+更新日時ではなく内容のハッシュを使う")
+    parser.add_argument("--in-memory-cards", action="store_true",
+                        help="生成したカードをメモリに保持し、ページ生成へPNGを経由せずに渡す")
+    parser.add_argument("--card-store-mb", type=int, default=2048,
+                        help="メモリに保持するカードの上限（MB、超えた分はPNGに書き出す）")
+    parser.add_argument("--no-card-files", action="store_true",
+                        help="カードPNGを保存しない（--in-memory-cards と併用）")
+    parser.add_argument("--headless", action="store_true",
+                        help="配置画面を開かずにCSVの順番のままページを生成する")
+    parser.add_argument("--pattern-rule", default="first",
+                        help=f"ヘッドレス時のパターン選択ルール（{' / '.join(PATTERN_RULES)} / パターンID）")
+    parser.add_argument("--page-workers", type=int, default=None,
+                        help="ヘッドレス時のページ生成プロセス数（省略時は --workers と同じ、"
+                             "カード生成と並行する場合はその半分）")
+    parser.add_argument("--no-stream-pages", action="store_true",
+                        help="カード生成と並行せず、全カードの生成が終わってからページを生成する")
+    parser.add_argument("--image-mirror", default=None,
+                        help=f"商品画像のローカルコピー先（省略時は 出力先/{IMAGE_MIRROR_DIRNAME}）")
+    parser.add_argument("--no-image-mirror", action="store_true",
+                        help="商品画像をローカルにコピーせず元の場所から直接読む")
+    parser.add_argument("--prefetch-workers", type=int, default=8,
+                        help="商品画像を先読みコピーするスレッド数")
+    parser.add_argument("--timing", action="store_true",
+                        help="行・ページごとの段階別の処理時間を log/*_timing.jsonl に書き出す")
+    parser.add_argument("--profile-rows", type=parse_row_range, default=None, metavar="開始:終了",
+                        help="指定したデータ行（1始まり）を cProfile・tracemalloc で計測する（--timing も有効になる）")
+    args = parser.parse_args(argv)
+    if args.retry_failures and args.shard:
+        parser.error("--retry-failures と --shard は同時に指定できません")
+    if args.retry_failures and args.csv:
+        parser.error("--retry-failures と --csv は同時に指定できません")
+    if args.no_card_files and not args.in_memory_cards:
+        parser.error("--no-card-files は --in-memory-cards と併用してください")
+    if args.profile_rows:
+        args.timing = True
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.merge_shards:
+        # シャードごとのログをまとめるだけ（カード・ページは生成しない）
+        from modules.sharding import merge_shard_logs
+        try:
+            merge_shard_logs(args.merge_shards, datetime.datetime.now().strftime("%Y%m%d%H%M%S"))
+        except (OSError, ValueError) as e:
+            print(f"シャードのログをまとめられませんでした: {e}")
+        return
+    if args.shard and not args.headless:
+        print("シャード実行では配置画面を使わずにページを生成します（--headless）")
+        args.headless = True
+    if not args.headless and not gui_available():
+        print("画面を表示できない環境のため、配置画面を使わずにページを生成します（--headless）")
+        args.headless = True
+
+    from modules.card_create import ProductCardGenerator
+    from modules.render_cache import RenderCache
+    from modules.card_store import CardStore
+    from modules.preview_cache import PREVIEW_SCALES
+    from modules.image_mirror import ImageMirror
+    from modules.encoder import OutputEncoder
+    from modules.settings import load_settings
+    from modules.fonts import configure_fonts
+    from modules.csv_source import read_csv
+    from modules.timing import Instrumentation, TimingLog
+    from modules.page_batch import HeadlessPageCreator
+    from modules.run_journal import RunJournal
+    from modules.sharding import ROW_NUMBER_COLUMN, shard_tag, row_in_shard, page_row_numbers
+    from modules.run_logs import (CARD_LOG_SUFFIX, PAGE_LOG_SUFFIX, PAGE_LOG_HEADER, write_log, page_log_rows,
+                                  read_card_log, failed_card_indices, merge_retried)
+
+    csv_path = args.csv
+    base_output_dir = args.output
+    if (not csv_path and not args.retry_failures) or not base_output_dir:
+        if not gui_available():
+            print("画面を表示できない環境では --csv と --output を指定してください。")
+            return
+        from tkinter import filedialog
+
+    # CSVファイルを1回だけ選択（--retry-failures では前回のログが入力になる）
+    if not csv_path and not args.retry_failures:
+        csv_path = filedialog.askopenfilename(title="CSVファイルを選択", filetypes=[("CSV files", "*.csv")])
+    if not csv_path and not args.retry_failures:
         print("CSVファイルが選択されませんでした。")
         return
 
     # 保存先フォルダを選択
-    base_output_dir = filedialog.askdirectory(title="保存先フォルダを選択")
+    if not base_output_dir:
+        base_output_dir = filedialog.askdirectory(title="保存先フォルダを選択")
     if not base_output_dir:
         print("保存先フォルダが選択されませんでした。")
         return
@@ -34,53 +149,177 @@ def main():
     os.makedirs(a4_output_dir, exist_ok=True)
     os.makedirs(log_dir, exist_ok=True)
 
-    # エンコーディング自動検出
-    encoding = detect_encoding(csv_path)
-    if not encoding:
-        encoding = 'shift_jis'  # フォールバック
+    retry_indices = None
+    if args.retry_failures:
+        # 前回のカード作成ログからエラーの行だけをカード生成へ流す（ページ生成には全行を使う）
+        header, previous_rows = read_card_log(args.retry_failures)
+        retry_indices = failed_card_indices(previous_rows)
+        data_rows = [row[:-2] for row in previous_rows]
+        print(f"前回のログでエラーになった {len(retry_indices)}行を再処理します: {args.retry_failures}")
+
+        def stream_rows():
+            for index in retry_indices:
+                yield data_rows[index]
+    else:
+        # CSVデータを読み込み（エンコーディングは先頭から自動検出、行は読みながらカード生成へ流す）
+        header, rows = read_csv(csv_path)
+        data_rows = []  # ページ生成用に読んだ行を控えておく
+        row_numbers = []  # data_rows の元のCSVでのデータ行番号（シャードのログ用）
 
-    # CSVデータを読み込み
-    with open(csv_path, 'r', encoding=encoding) as f:
-        csv_data = list(csv.reader(f))
-    header = csv_data[0]
-    data_rows = csv_data[1:]
+        def in_shard(row):
+            # シャード実行では担当するページ商品名の行だけを流す
+            return not args.shard or row_in_shard(row, args.shard)
 
-    # タイムスタンプの生成（両方のログで同じものを使用）
+        def stream_rows(on_row=None):
+            for row_number, row in enumerate(rows, 1):
+                if not in_shard(row):
+                    continue
+                data_rows.append(row)
+                row_numbers.append(row_number)
+                if on_row is not None:
+                    on_row(row)
+                yield row
+
+    # タイムスタンプの生成（両方のログで同じものを使用、シャード実行ではシャード名を付ける）
     timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    tag = shard_tag(args.shard) if args.shard else None
+    log_prefix = f"{timestamp}_{tag}" if tag else timestamp
+
+    # 保存形式・圧縮設定（settings.json）
+    settings = load_settings(args.settings)
+    if args.image_format:
+        settings["image_format"] = args.image_format
+    encoder = OutputEncoder.from_settings(settings)
+    # フォント検索パス（空なら OS ごとの既定のフォルダ）
+    configure_fonts(settings.get("font_dirs") or None)
+
+    # 完了したカード・ページを1件ずつ記録する（--resume なら前回の完了分を使い回す）
+    # （エラー行の再処理では、元の実行の記録を残したまま追記する）
+    # （シャードごとに別のファイルを使い、同じ出力先に書く他のシャードと混ざらないようにする）
+    journal = RunJournal(base_output_dir, resume=args.resume or bool(args.retry_failures), tag=tag)
 
     # 1. カード生成プロセス
-    generator = ProductCardGenerator()
-    card_rows = [header]
-    if len(header) < 8 or header[7] != "ステータス":
+    image_mirror = None
+    if not args.no_image_mirror:
+        mirror_dir = args.image_mirror or os.path.join(base_output_dir, IMAGE_MIRROR_DIRNAME)
+        image_mirror = ImageMirror(mirror_dir, workers=args.prefetch_workers)
+    # 元画像キャッシュは全プロセスの合計を --image-cache-mb に収める（プロセス数が増えても使用メモリを増やさない）
+    image_cache_bytes = args.image_cache_mb * 1024 * 1024 // max(1, args.workers or 1)
+    # プレビュー用サムネイルは配置画面を使うときだけカードと一緒に書き出す（ヘッドレスでは誰も読まない）
+    generator = ProductCardGenerator(image_cache_bytes=image_cache_bytes, encoder=encoder,
+                                     image_mirror=image_mirror,
+                                     preview_scales=() if args.headless else PREVIEW_SCALES)
+    if retry_indices is None and (len(header) < 8 or header[7] != "ステータス"):
         header.extend(["ステータス", "エラーログ"])
 
     # カード生成の処理
-    card_results = generator.process_csv_data(data_rows, output_dir)
-    card_rows.extend(card_results)
+    render_cache = None if args.force else RenderCache(output_dir, hash_content=args.hash_images, tag=tag)
+    card_store = (CardStore(max_bytes=args.card_store_mb * 1024 * 1024, encoder=encoder)
+                  if args.in_memory_cards else None)
+    instrumentation = None
+    card_timing_log = None
+    if args.timing:
+        instrumentation = Instrumentation(profile_rows=args.profile_rows,
+                                          profile_dir=os.path.join(log_dir, f"{log_prefix}_profile"))
+        card_timing_log = TimingLog(os.path.join(log_dir, f"{log_prefix}_card_timing.jsonl"))
+
+    def card_stage(card_input, on_result=None):
+        # カードを生成し、終わったらすぐにカード作成ログを保存する（ページ生成と並行する場合は別スレッドで実行）
+        card_results = generator.process_csv_data(card_input, output_dir, workers=args.workers,
+                                                  render_cache=render_cache, card_store=card_store,
+                                                  write_files=not args.no_card_files,
+                                                  instrumentation=instrumentation, timing_log=card_timing_log,
+                                                  max_in_flight=args.max_in_flight, journal=journal,
+                                                  on_result=on_result)
+        if card_timing_log is not None:
+            card_timing_log.close()
+        if retry_indices is not None:
+            fixed = sum(1 for result in card_results if result[-2] == "正常")
+            print(f"再処理の結果: 正常 {fixed}行 / エラー {len(card_results) - fixed}行")
+            # 再処理しなかった行は前回のログのまま、元の行順でまとめる
+            card_results = merge_retried(previous_rows, retry_indices, card_results)
+        card_rows = [header] + card_results
+        if tag:
+            # シャードのログは元の行番号を先頭の列に付け、--merge-shards で元の行順に戻せるようにする
+            card_rows = [[ROW_NUMBER_COLUMN] + header] + [
+                [str(row_number)] + result for row_number, result in zip(row_numbers, card_results)
+            ]
 
-    # カード生成ログの保存
-    card_log_filename = f"{timestamp}_card_create_log.csv"
-    card_log_path = os.path.join(log_dir, card_log_filename)
-    with open(card_log_path, 'w', encoding='shift_jis', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerows(card_rows)
-    print(f"カード作成ログを保存しました: {card_log_path}")
+        # カード生成ログの保存
+        card_log_path = os.path.join(log_dir, f"{log_prefix}{CARD_LOG_SUFFIX}")
+        write_log(card_log_path, card_rows)
+        print(f"カード作成ログを保存しました: {card_log_path}")
+        return card_results
 
     # 2. ページ生成プロセス
-    creator = PageCreator()
-    page_rows = [header]
+    stream_pages = not args.no_stream_pages
+    if args.headless:
+        # カード生成と並行する場合は、ページ生成のプロセス数を控えめにしてカード生成のCPUを残す
+        page_workers = args.page_workers or (max(1, args.workers // 2) if stream_pages else args.workers)
+        creator = HeadlessPageCreator(pattern_rule=args.pattern_rule, workers=page_workers,
+                                      page_manifest=not args.force, hash_content=args.hash_images,
+                                      card_store=card_store, encoder=encoder, timing=args.timing,
+                                      max_in_flight=args.max_in_flight, journal=journal, manifest_tag=tag)
+    else:
+        from modules.page_create import PageCreator
+        creator = PageCreator(page_manifest=not args.force, card_store=card_store, encoder=encoder,
+                              timing=args.timing, journal=journal, hash_content=args.hash_images)
+    page_rows = [PAGE_LOG_HEADER]
 
-    # ページ生成の処理
-    page_results = creator.process_csv_data(data_rows, output_dir, a4_output_dir)
-    page_rows.extend(page_results)
+    if stream_pages:
+        # カード生成を別スレッドで進め、ページ商品名のカードが揃ったページから生成（配置画面に表示）する
+        from concurrent.futures import ThreadPoolExecutor
+        from modules.page_stream import PageStream, count_page_rows
+        if retry_indices is None:
+            # ページ商品名ごとの行数だけを先に数え（行は保持しない）、行は読みながらカード生成へ流す
+            _, counted_rows = read_csv(csv_path)
+            page_stream = PageStream(count_page_rows(row for row in counted_rows if in_shard(row)))
+            card_input = stream_rows(on_row=page_stream.add_row)
+        else:
+            # 前回のログは読み込み済みなので全行を先に渡す（再処理しない行のカードは揃っているものとする）
+            page_stream = PageStream(count_page_rows(data_rows))
+            retry_set = set(retry_indices)
+            for index, row in enumerate(data_rows):
+                page_stream.add_row(row, pending=index in retry_set)
+            card_input = stream_rows()
+
+        def card_done(index, result):
+            # ログ行は元の行の後ろにステータス・エラーログの2列を足したもの
+            page_stream.card_done(result[:-2])
+
+        with ThreadPoolExecutor(max_workers=1) as card_thread:
+            card_future = card_thread.submit(card_stage, card_input, card_done)
+            # カード生成が途中で止まっても、ページ生成が待ち続けないようにする
+            card_future.add_done_callback(lambda future: page_stream.close(future.exception()))
+            page_results = creator.process_csv_data(data_rows, output_dir, a4_output_dir, page_stream=page_stream)
+            card_future.result()
+    else:
+        card_stage(stream_rows())
+        page_results = creator.process_csv_data(data_rows, output_dir, a4_output_dir)
+    journal.close()
+    page_rows.extend(page_log_rows(page_results))
+    if tag:
+        row_number_of = page_row_numbers(data_rows, row_numbers)
+        page_rows = [[ROW_NUMBER_COLUMN] + PAGE_LOG_HEADER] + [
+            [str(row_number_of(entry["page_name"]))] + row
+            for entry, row in zip(page_results, page_rows[1:])
+        ]
 
     # ページ生成ログの保存
-    page_log_filename = f"{timestamp}_page_create_log.csv"
-    page_log_path = os.path.join(log_dir, page_log_filename)
-    with open(page_log_path, 'w', encoding='shift_jis', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerows(page_rows)
+    page_log_path = os.path.join(log_dir, f"{log_prefix}{PAGE_LOG_SUFFIX}")
+    write_log(page_log_path, page_rows)
     print(f"ページ作成ログを保存しました: {page_log_path}")
 
+    if args.timing:
+        page_timing_log = TimingLog(os.path.join(log_dir, f"{log_prefix}_page_timing.jsonl"))
+        for entry in page_results:
+            page_timing_log.write_page(entry)
+        page_timing_log.close()
+
+    # ピークメモリ（親プロセスと、段階ごとのワーカープロセス）
+    worker_peaks = [("カード生成", generator.worker_peak_rss),
+                    ("ページ生成", getattr(creator, "worker_peak_rss", {}))]
+    print(f"ピークメモリ: {format_peak_rss(peak_rss_bytes(), worker_peaks)}")
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -1,118 +1,155 @@
 import os
 import csv
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageDraw, ImageFont
-import sys
+from PIL import Image, ImageDraw
 import datetime
-import shutil
-from concurrent.futures import ThreadPoolExecutor
+import time
 import functools
-import chardet
+import hashlib
+import json
+import dataclasses
+from .timing import timed
+from .fonts import font_registry, configure_fonts
+from .settings import load_settings
+from .image_cache import ImageCache, merge_stats, format_stats
+from .render_cache import file_fingerprint
+from .text_sprites import TextSpriteCache
+from .csv_source import read_csv
+from .preview_cache import PREVIEW_SCALES, save_previews
+from .encoder import OutputEncoder, merge_encode_stats, format_encode_stats
+from .page_generator import card_image_path
+from .card_specs import CARD_SPECS
+from .pipeline import bounded_map, process_pool, peak_rss_bytes
+
+# 16bitグレースケール（PNG・TIFF）を開いたときのモード。convert('RGB') では 255 を超える値が白に飽和する
+WIDE_GRAY_MODES = ("I", "I;16", "I;16B", "I;16L", "I;16N")
+# 16bitの値 -> 8bitのグレー（"I" の point は関数だと "I" のまま返るので、変換表で "L" にする）
+WIDE_TO_GRAY = [value >> 8 for value in range(0x10000)]
+
+def has_transparency(image):
+    """透過情報を持つ画像か（アルファチャンネル、またはパレット・色指定の透過色）"""
+    return image.mode in ("RGBA", "RGBa", "LA", "La", "PA") or "transparency" in image.info
+
+def to_render_mode(image):
+    """描画用に、透過のある画像は RGBA、それ以外は RGB（8bit）に変換する"""
+    if image.mode in WIDE_GRAY_MODES:
+        wide = image if image.mode == "I" else image.convert("I")
+        gray = wide.point(WIDE_TO_GRAY, "L")
+        transparency = image.info.get("transparency")
+        if isinstance(transparency, int) and 0 <= transparency <= 0xFFFF:
+            # 透過色と同じ値の画素だけを透明にする（"I" は ImageChops で扱えないので同じく変換表で作る）
+            alpha_table = [255] * 0x10000
+            alpha_table[transparency] = 0
+            alpha = wide.point(alpha_table, "L")
+            return Image.merge("RGBA", (gray, gray, gray, alpha))
+        return gray.convert("RGB")
+    return image.convert("RGBA" if has_transparency(image) else "RGB")
 
 class ProductCardGenerator:
-    def __init__(self):
-        # オールサイズ
-        self.full_card_width = 1704
-        self.full_card_height = 2000
-        self.full_product_image_width = 1582
-        self.full_product_image_height = 1582
-        self.full_product_image_x = 57
-        self.full_product_image_y = 60
-        self.full_number_x = 852  # センター（カラー英字と同じ）
-        self.full_number_y = 1956
-        self.full_product_name_x = 852  # センター
-        self.full_product_name_y = 1710  # 画像下部（95+1582=1677）から少し下
-        self.full_color_jp_x = 852  # センター
-        self.full_color_jp_y = 1829
-        self.full_color_en_x = 852  # センター
-        self.full_color_en_y = 1893
-        self.full_font_normal_size = 50  # 12pt → 50px
-        self.full_font_large_size = 83   # 20pt → 83px
-        self.full_font_number_size = 33  # 8pt → 33px
-        
-        # ハーフサイズ
-        self.half_card_width = 852
-        self.half_card_height = 1000
-        self.half_product_image_width = 730
-        self.half_product_image_height = 730
-        self.half_product_image_x = 60
-        self.half_product_image_y = 60
-        self.half_number_x = 426  # センター（カラー英字と同じ）
-        self.half_number_y = 956  # カラー英字（y=896）の下（896+33+10）
-        self.half_product_name_x = 426  # センター
-        self.half_product_name_y = 790
-        self.half_color_jp_x = 426  # センター
-        self.half_color_jp_y = 849
-        self.half_color_en_x = 426  # センター
-        self.half_color_en_y = 896 
-        self.half_font_normal_size = 42  # 10pt → 42px
-        self.half_font_large_size = 67   # 16pt → 67px
-        self.half_font_number_size = 33  # 8pt → 33px
-
-        # フォントの初期化（キャッシュ）
+    def __init__(self, image_cache_bytes=512 * 1024 * 1024, preview_scales=PREVIEW_SCALES, encoder=None,
+                 image_mirror=None, font_search_path=None, card_specs=None):
+        # カードサイズごとの寸法・文字位置（CardSpec、サイズの追加は card_specs.CARD_SPECS に書く）
+        self.card_specs = dict(card_specs or CARD_SPECS)
+
+        # フォントの初期化（ワーカープロセスでは親プロセスと同じ検索パスでレジストリを作る）
+        if font_search_path is not None and font_search_path != font_registry().search_path:
+            configure_fonts(font_search_path)
+        self.font_files = []
         self.fonts = self._initialize_fonts()
+        self._render_fingerprint = None
         
-        # 画像キャッシュ
-        self.image_cache = {}
+        # 画像キャッシュ（メモリ上限付きLRU）
+        self.image_cache_bytes = image_cache_bytes
+        self.image_cache = ImageCache(max_bytes=image_cache_bytes)
+
+        # カード画像の保存形式（settings.json の image_format など）
+        self.encoder = encoder or OutputEncoder()
+
+        # カード保存時に一緒に書き出すプレビュー用サムネイルの縮尺（空なら書き出さない）
+        self.preview_scales = tuple(preview_scales)
+
+        # テキストスプライトキャッシュ（カラー名・商品名は行をまたいで繰り返し現れる）
+        self.text_sprites = TextSpriteCache()
+
+        # 共有ドライブの商品画像のローカルコピー（ImageMirror、None なら元の場所から直接読む）
+        self.image_mirror = image_mirror
+
+        # ワーカープロセスごとのピークメモリ（{pid: バイト数}、並列処理したときだけ記録する）
+        self.worker_peak_rss = {}
 
     def _initialize_fonts(self):
+        # フォントはプロセス共通のレジストリから取得する（同じフォント・サイズは1回だけ読み込む）
+        registry = font_registry()
+        self.font_files = registry.font_files(("regular", "bold"))
         fonts = {}
-        try:
-            font_path = "C:/Windows/Fonts/YUGOTHR.TTC" if sys.platform == "win32" else "/usr/share/fonts/truetype/yu/YuGothic-Regular.ttf"
-            font_path_bold = "C:/Windows/Fonts/YUGOTHB.TTC" if sys.platform == "win32" else "/usr/share/fonts/truetype/yu/YuGothic-Bold.ttf"
-            
-            # フルサイズ用フォント
-            fonts['full_normal'] = ImageFont.truetype(font_path, self.full_font_normal_size, index=0)
-            fonts['full_large'] = ImageFont.truetype(font_path_bold, self.full_font_large_size, index=1)
-            fonts['full_number'] = ImageFont.truetype(font_path, self.full_font_number_size, index=0)
-            
-            # ハーフサイズ用フォント
-            fonts['half_normal'] = ImageFont.truetype(font_path, self.half_font_normal_size, index=0)
-            fonts['half_large'] = ImageFont.truetype(font_path_bold, self.half_font_large_size, index=1)
-            fonts['half_number'] = ImageFont.truetype(font_path, self.half_font_number_size, index=0)
-        except:
-            try:
-                # フォールバックフォント
-                fonts['full_normal'] = ImageFont.truetype("msgothic.ttc", self.full_font_normal_size)
-                fonts['full_large'] = ImageFont.truetype("msgothic.ttc", self.full_font_large_size)
-                fonts['full_number'] = ImageFont.truetype("msgothic.ttc", self.full_font_number_size)
-                fonts['half_normal'] = ImageFont.truetype("msgothic.ttc", self.half_font_normal_size)
-                fonts['half_large'] = ImageFont.truetype("msgothic.ttc", self.half_font_large_size)
-                fonts['half_number'] = ImageFont.truetype("msgothic.ttc", self.half_font_number_size)
-            except:
-                # 最終フォールバック
-                default_font = ImageFont.load_default()
-                fonts = {k: default_font for k in ['full_normal', 'full_large', 'full_number', 
-                                                 'half_normal', 'half_large', 'half_number']}
+        for spec in self.card_specs.values():
+            for font_name, role, font_size in spec.fonts:
+                fonts[f'{spec.name}_{font_name}'] = registry.font(role, font_size)
         return fonts
 
+    def worker_kwargs(self):
+        """ワーカープロセスで同じ設定のジェネレーターを作るための引数"""
+        return {
+            "image_cache_bytes": self.image_cache_bytes,
+            "preview_scales": self.preview_scales,
+            "encoder": self.encoder,
+            "image_mirror": self.image_mirror,
+            "font_search_path": font_registry().search_path,
+            "card_specs": self.card_specs,
+        }
+
+    def source_image_path(self, image_path):
+        """描画時に実際に読む商品画像のパス（ミラー使用時はローカルコピー）"""
+        if self.image_mirror is None:
+            return image_path
+        return self.image_mirror.local_path(image_path)
+
+    def cache_stats(self):
+        return {
+            "画像キャッシュ": self.image_cache.stats(),
+            "テキストキャッシュ": self.text_sprites.stats(),
+            "エンコード": self.encoder.stats(),
+        }
+
+    def render_fingerprint(self):
+        """カードの見た目に影響する設定（サイズ・位置・フォントファイル）のハッシュ"""
+        if self._render_fingerprint is None:
+            specs = [dataclasses.asdict(spec) for _, spec in sorted(self.card_specs.items())]
+            fonts = [(path, file_fingerprint(path)) for path in self.font_files]
+            payload = json.dumps([specs, fonts, sorted(self.encoder.settings().items())],
+                                 ensure_ascii=False)
+            self._render_fingerprint = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return self._render_fingerprint
+
     def _get_cached_image(self, image_path):
-        if image_path not in self.image_cache:
+        image = self.image_cache.get(image_path)
+        if image is None:
             try:
                 image = Image.open(image_path)
-                self.image_cache[image_path] = image
+                self.image_cache.put(image_path, image)
             except Exception as e:
                 print(f"画像読み込みエラー: {e}")
                 return None
-        return self.image_cache[image_path]
+        return image
 
-    def fit_to_rect(self, image, width, height):
+    def _fit_size(self, image_size, width, height):
         # 画像のアスペクト比を計算
-        img_ratio = image.width / image.height
+        img_ratio = image_size[0] / image_size[1]
         target_ratio = width / height
 
         if img_ratio > target_ratio:
             # 画像が横長の場合、幅に合わせる
-            new_width = width
-            new_height = int(width / img_ratio)
-        else:
-            # 画像が縦長の場合、高さに合わせる
-            new_height = height
-            new_width = int(height * img_ratio)
+            return width, int(width / img_ratio)
+        # 画像が縦長の場合、高さに合わせる
+        return int(height * img_ratio), height
 
-        # 画像をリサイズ
-        resized = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    def fit_to_rect(self, image, width, height):
+        new_width, new_height = self._fit_size(image.size, width, height)
+
+        # 画像をリサイズ（正規化済みで既に同じサイズならそのまま使う）
+        if (new_width, new_height) != image.size:
+            resized = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        else:
+            resized = image
 
         # 背景を作成
         background = Image.new(image.mode, (width, height), 'white' if image.mode == 'RGB' else (255, 255, 255, 0))
@@ -125,200 +162,230 @@ class ProductCardGenerator:
         background.paste(resized, (offset_x, offset_y))
         return background
 
-    def create_card(self, image_path, product_name, color_jp, color_en, item_code, size="full"):
-        # サイズに応じたパラメータの設定
-        params = {
-            "full": {
-                "card_width": self.full_card_width,
-                "card_height": self.full_card_height,
-                "product_image_width": self.full_product_image_width,
-                "product_image_height": self.full_product_image_height,
-                "product_image_x": self.full_product_image_x,
-                "product_image_y": self.full_product_image_y,
-                "number_x": self.full_number_x,
-                "number_y": self.full_number_y,
-                "product_name_x": self.full_product_name_x,
-                "product_name_y": self.full_product_name_y,
-                "color_jp_x": self.full_color_jp_x,
-                "color_jp_y": self.full_color_jp_y,
-                "color_en_x": self.full_color_en_x,
-                "color_en_y": self.full_color_en_y,
-                "fonts": {
-                    "normal": self.fonts['full_normal'],
-                    "large": self.fonts['full_large'],
-                    "number": self.fonts['full_number']
-                }
-            },
-            "half": {
-                "card_width": self.half_card_width,
-                "card_height": self.half_card_height,
-                "product_image_width": self.half_product_image_width,
-                "product_image_height": self.half_product_image_height,
-                "product_image_x": self.half_product_image_x,
-                "product_image_y": self.half_product_image_y,
-                "number_x": self.half_number_x,
-                "number_y": self.half_number_y,
-                "product_name_x": self.half_product_name_x,
-                "product_name_y": self.half_product_name_y,
-                "color_jp_x": self.half_color_jp_x,
-                "color_jp_y": self.half_color_jp_y,
-                "color_en_x": self.half_color_en_x,
-                "color_en_y": self.half_color_en_y,
-                "fonts": {
-                    "normal": self.fonts['half_normal'],
-                    "large": self.fonts['half_large'],
-                    "number": self.fonts['half_number']
-                }
-            }
-        }[size]
-
-        # カード作成
-        card = Image.new('RGB', (params["card_width"], params["card_height"]), 'white')
-        draw = ImageDraw.Draw(card)
-
-        # 商品画像
-        product_image = self._get_cached_image(image_path)
+    def _normalize_image(self, image, width, height, timer=None):
+        """元画像を1回だけデコード・モード変換し、width×height の枠に収まるサイズの中間画像を返す"""
+        target_size = self._fit_size(image.size, width, height)
+
+        with timed(timer, "decode"):
+            # JPEGはデコード時に1/2〜1/8へ縮小できる（target_size以上は保たれる）
+            if image.format == 'JPEG':
+                image.draft('RGB', target_size)
+            image = to_render_mode(image)
+        if target_size[0] < image.width:
+            with timed(timer, "resize"):
+                image = image.resize(target_size, Image.Resampling.LANCZOS)
+        return image
+
+    def load_product_images(self, image_path, sizes=("full", "half"), timer=None):
+        """商品画像を1回だけデコードし、各サイズの画像枠に合わせた画像を {size: image} で返す"""
+        with timed(timer, "decode"):
+            product_image = self._get_cached_image(image_path)
         if product_image is None:
             return None
 
-        if product_image.mode == 'RGBA':
-            product_image = self.fit_to_rect(
-                product_image.convert('RGBA'),
-                params["product_image_width"],
-                params["product_image_height"]
-            )
-            card = card.convert('RGBA')
-            card.paste(product_image, (params["product_image_x"], params["product_image_y"]), product_image.split()[3])
-            card = card.convert('RGB')
-        else:
-            product_image = self.fit_to_rect(
-                product_image.convert('RGB'),
-                params["product_image_width"],
-                params["product_image_height"]
-            )
-            card.paste(product_image, (params["product_image_x"], params["product_image_y"]))
-
-        # テキスト描画
-        draw.text(
-            (params["number_x"], params["number_y"]),
-            item_code,
-            font=params["fonts"]["number"],
-            fill='black',
-            stroke_width=5,
-            stroke_fill='white',
-            anchor="mm"
-        )
-        draw.text(
-            (params["product_name_x"], params["product_name_y"]),
-            product_name,
-            font=params["fonts"]["normal"],
-            fill='black',
-            stroke_width=5,
-            stroke_fill='white',
-            anchor="mm"
-        )
-        draw.text(
-            (params["color_en_x"], params["color_en_y"]),
-            color_en,
-            font=params["fonts"]["large"],
-            fill='black',
-            stroke_width=5,
-            stroke_fill='white',
-            anchor="mm"
-        )
-        draw.text(
-            (params["color_jp_x"], params["color_jp_y"]),
-            color_jp,
-            font=params["fonts"]["normal"],
-            fill='black',
-            stroke_width=5,
-            stroke_fill='white',
-            anchor="mm"
+        boxes = {size: self.card_specs[size].image_size for size in sizes}
+        # 最も大きい枠に合わせた中間画像から全サイズを作る
+        intermediate = self._normalize_image(
+            product_image,
+            max(width for width, _ in boxes.values()),
+            max(height for _, height in boxes.values()),
+            timer
         )
+        # draftでデコードサイズが変わるため、キャッシュ上のサイズを実サイズに更新
+        if image_path in self.image_cache:
+            self.image_cache.put(image_path, product_image)
+        with timed(timer, "resize"):
+            return {size: self.fit_to_rect(intermediate, width, height) for size, (width, height) in boxes.items()}
+
+    def create_card(self, image_path, product_name, color_jp, color_en, item_code, size="full", product_image=None,
+                    timer=None):
+        spec = self.card_specs[size]
+
+        # 商品画像（未指定なら読み込んで枠に合わせる）
+        if product_image is None:
+            product_images = self.load_product_images(image_path, sizes=(size,), timer=timer)
+            if product_images is None:
+                return None
+            product_image = product_images[size]
+
+        # カード作成
+        with timed(timer, "compose"):
+            card = spec.blank_card().copy()
+
+            if product_image.mode == 'RGBA':
+                # 商品画像の範囲だけをアルファで合成する（カード全体のモード変換はしない）
+                card.paste(product_image, spec.image_xy, product_image)
+            else:
+                card.paste(product_image, spec.image_xy)
+
+        # 変換後のカードに描画する
+        draw = ImageDraw.Draw(card)
+
+        # テキスト描画（ラスタライズ済みのテキストを再利用）
+        texts = {"item_code": item_code, "product_name": product_name, "color_jp": color_jp, "color_en": color_en}
+        with timed(timer, "text"):
+            for slot in spec.texts:
+                font_key = f"{size}_{slot.font}"
+                self.text_sprites.draw(
+                    draw,
+                    slot.xy,
+                    texts[slot.field],
+                    font_key,
+                    self.fonts[font_key],
+                    fill='black',
+                    stroke_width=5,
+                    stroke_fill='white',
+                    anchor="mm"
+                )
 
         return card
 
     def process_csv(self):
+        from tkinter import filedialog
         csv_path = filedialog.askopenfilename(title="CSVファイルを選択", filetypes=[("CSV files", "*.csv")])
         if not csv_path:
             print("CSVファイルが選択されませんでした。")
             return None
 
-        # エンコーディング自動検出
-        encoding = detect_encoding(csv_path)
-        if not encoding:
-            encoding = 'shift_jis'  # フォールバック
-
-        # CSVを読み込み
+        # CSVを読み込み（エンコーディングは先頭から自動検出、行は読みながら処理）
         rows = []
-        with open(csv_path, 'r', encoding=encoding) as f:
-            reader = csv.reader(f)
-            header = next(reader)
-            if len(header) < 8 or header[7] != "ステータス":
-                header.extend(["ステータス", "エラーログ"])
-            rows.append(header)
-
-            data_rows = list(reader)
+        header, data_rows = read_csv(csv_path)
+        if len(header) < 8 or header[7] != "ステータス":
+            header.extend(["ステータス", "エラーログ"])
+        rows.append(header)
 
         # 画像生成の並列処理
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            process_func = functools.partial(process_row, self, output_dir="output")
-            results = list(executor.map(lambda row: process_func(row), data_rows))
+        results = self.process_csv_data(data_rows, "output", workers=os.cpu_count())
 
         rows.extend(results)
         return rows
 
-    def process_csv_data(self, data_rows, output_dir):
+    def process_csv_data(self, data_rows, output_dir, workers=1, chunksize=None, render_cache=None,
+                         card_store=None, write_files=True, instrumentation=None, timing_log=None, max_in_flight=None,
+                         journal=None, on_result=None):
+        """各行のカードを生成し、元の行順のままログ行のリストを返す
+
+        render_cache を渡すと、入力が前回と同じでカード画像が残っている行は生成を省く。
+        card_store を渡すと生成したカードをメモリに保持し（ページ生成へ直接渡す）、
+        write_files=False ならカードPNGの保存を省く。
+        instrumentation（Instrumentation）を渡すと行ごとの段階別の時間を計り、timing_log（TimingLog）に書き出す。
+        max_in_flight はワーカーに投入済みで結果を回収していない行数の上限（省略時はワーカー数の2倍）。
+        journal（RunJournal）を渡すと完了した行を1行ずつ記録し、前回の実行で完了済みの行は生成を省く。
+        on_result(行番号, ログ行) は各行が終わるたびに（スキップした行も含めて）呼ばれる。
+        """
         results = []
-        for row in data_rows:
-            try:
-                if len(row) < 5:  # 必要な列数をチェック
-                    results.append(row + ["エラー", "データ列が不足しています"])
-                    continue
-
-                item_code = row[0]
-                image_path = row[1]
-                product_name = row[2]
-                color_jp = row[3]
-                color_en = row[4]
-
-                status = "正常"
-                error_log = ""
-
-                if not os.path.exists(image_path):
-                    results.append(row + ["エラー", f"画像ファイルが見つかりません: {image_path}"])
-                    continue
-
-                # フルサイズカード生成
-                full_card = self.create_card(
-                    image_path, product_name, color_jp, color_en, item_code, size="full"
-                )
-                if full_card:
-                    output_path = os.path.join(output_dir, f"{item_code}-{product_name}_{color_jp}_full.png")
-                    full_card.save(output_path)
-                    print(f"カード（オール）を生成しました: {output_path}")
-                else:
-                    status = "エラー"
-                    error_log = "フルサイズカードの生成に失敗しました"
-
-                # ハーフサイズカード生成
-                half_card = self.create_card(
-                    image_path, product_name, color_jp, color_en, item_code, size="half"
-                )
-                if half_card:
-                    output_path = os.path.join(output_dir, f"{item_code}-{product_name}_{color_jp}_half.png")
-                    half_card.save(output_path)
-                    print(f"カード（ハーフ）を生成しました: {output_path}")
-                else:
-                    status = "エラー"
-                    error_log += ", ハーフサイズカードの生成に失敗しました" if error_log else "ハーフサイズカードの生成に失敗しました"
-
-                results.append(row + [status, error_log])
-            except Exception as e:
-                results.append(row + ["エラー", f"処理中にエラーが発生: {str(e)}"])
-
+        pending = {}  # 行番号 -> (カード名, キー)
+        rows_by_index = {}  # 生成中の行番号 -> (行, カード画像パス)（ジャーナル記録用）
+
+        def pending_rows():
+            # キャッシュ・ジャーナルに当たらなかった行だけを（行番号付きで）読みながら生成側へ流す
+            for row in data_rows:
+                index = len(results)
+                results.append(None)
+                output_paths = []
+                if len(row) >= 5:
+                    item_code, image_path, product_name, color_jp, color_en = row[:5]
+                    output_paths = [
+                        card_image_path(output_dir, item_code, product_name, color_jp, size, self.encoder.extension)
+                        for size in ("full", "half")
+                    ]
+                if journal is not None and output_paths:
+                    finished = journal.finished_card(row, output_paths)
+                    if finished is not None:
+                        results[index] = finished
+                        if on_result is not None:
+                            on_result(index, finished)
+                        continue
+                if render_cache is not None and output_paths:
+                    name = f"{item_code}-{product_name}_{color_jp}"
+                    key = render_cache.card_key(
+                        self.render_fingerprint(), image_path, item_code, product_name, color_jp, color_en
+                    )
+                    if render_cache.is_fresh(name, key, output_paths):
+                        results[index] = row + ["正常", "入力に変更がないため生成をスキップしました（キャッシュ）"]
+                        if timing_log is not None:
+                            timing_log.write_card(index, results[index], cached=True)
+                        if journal is not None:
+                            journal.record_card(row, results[index], output_paths, rendered=False)
+                        if on_result is not None:
+                            on_result(index, results[index])
+                        continue
+                    pending[index] = (name, key)
+                if journal is not None:
+                    rows_by_index[index] = (row, output_paths)
+                yield index, row
+
+        row_count = len(data_rows) if isinstance(data_rows, list) else None
+        for index, result, timings in self._render_rows(pending_rows(), output_dir, workers, chunksize, card_store,
+                                                        write_files, instrumentation, row_count, max_in_flight):
+            results[index] = result
+            if timing_log is not None:
+                if timings is not None and self.image_mirror is not None and len(result) > 1:
+                    # 共有ドライブからのコピー（先読み）にかかった時間
+                    fetch_seconds = self.image_mirror.pop_fetch_seconds(result[1])
+                    if fetch_seconds is not None:
+                        timings["ms"]["fetch"] = round(fetch_seconds * 1000, 3)
+                timing_log.write_card(index, result, timings)
+            # ファイルを書かない場合は古いPNGと食い違うのでキーを更新しない
+            if index in pending and write_files and result[-2] == "正常":
+                render_cache.update(*pending[index])
+            if journal is not None:
+                row, output_paths = rows_by_index.pop(index)
+                journal.record_card(row, result, output_paths)
+            if on_result is not None:
+                on_result(index, result)
+
+        if render_cache is not None:
+            render_cache.save()
+            print(f"レンダーキャッシュ: ヒット {render_cache.hits} / 再生成 {render_cache.misses}")
         return results
 
+    def _render_rows(self, items, output_dir, workers=1, chunksize=None, card_store=None, write_files=True,
+                     instrumentation=None, row_count=None, max_in_flight=None):
+        """(行番号, 行) を受け取ってカードを生成し、(行番号, ログ行, 計測結果) を行順に返すジェネレーター"""
+        if workers is None:
+            workers = os.cpu_count() or 1
+        # 件数が分かる場合だけ小さな入力を逐次処理にする
+        if row_count is not None and row_count <= 1:
+            workers = 1
+        max_in_flight = max(workers, max_in_flight or workers * 2)
+        if chunksize is None:
+            chunksize = max(1, row_count // (workers * 4)) if row_count else 4
+        # 全ワーカーに仕事が行き渡るよう、1チャンクは上限をワーカー数で割った行数まで
+        chunksize = max(1, min(chunksize, max_in_flight // workers))
+        if self.image_mirror is not None:
+            # 先の行の画像をローカルへコピーしながら流す（描画はローカルコピーだけを読む）
+            items = self.image_mirror.prefetch(items, image_path_of=_item_image_path)
+        if workers <= 1:
+            for index, row in items:
+                rendered = {} if card_store is not None else None
+                result, timings = run_row(self, index, row, output_dir, rendered, write_files, instrumentation)
+                for path, card in (rendered or {}).items():
+                    card_store.put(path, card, saved=write_files and result[-2] == "正常")
+                yield index, result, timings
+            print_cache_stats([self.cache_stats()])
+            return
+
+        # LANCZOS縮小・テキスト描画・PNGエンコードはGILを保持するためプロセスで並列化
+        # 投入する行は max_in_flight 行までに抑え、結果を回収した分だけ次の行を読む
+        worker_stats = {}
+        with process_pool(workers, initializer=_init_worker, initargs=(self.worker_kwargs(),)) as executor:
+            for index, result, timings, pid, stats, rendered, peak_rss in bounded_map(
+                executor,
+                functools.partial(_process_row_in_worker, output_dir=output_dir,
+                                  keep_cards=card_store is not None, write_files=write_files,
+                                  instrumentation=instrumentation),
+                items,
+                max_in_flight,
+                chunksize=chunksize
+            ):
+                worker_stats[pid] = stats
+                self.worker_peak_rss[pid] = peak_rss
+                for path, card in (rendered or {}).items():
+                    card_store.put(path, card, saved=write_files and result[-2] == "正常")
+                yield index, result, timings
+        print_cache_stats(list(worker_stats.values()))
+
     def save_log(self, results, log_dir="log"):
         # logフォルダが存在しない場合は作成
         os.makedirs(log_dir, exist_ok=True)
@@ -337,56 +404,139 @@ class ProductCardGenerator:
         print(f"カード作成ログを保存しました: {log_path}")
         return log_path
 
-def process_row(generator, row, output_dir):
+def _save_card(generator, card, output_path, timer=None):
+    # エンコード用スレッドで実行される（プレビュー用サムネイルも一緒に書き出す）
+    generator.encoder.save(card, output_path, quantize=True, timer=timer)
+    if generator.preview_scales:
+        with timed(timer, "preview"):
+            save_previews(output_path, card, generator.preview_scales)
+
+def _item_image_path(item):
+    # (行番号, 行) の画像パス（B列）
+    row = item[1]
+    return row[1] if len(row) > 1 else None
+
+def _output_card(generator, card, output_path, label, rendered, write_files, timer=None):
+    # カード画像の保存をエンコーダーに回し、必要ならメモリ渡し用にも残す（保存待ちのFutureを返す）
+    if rendered is not None:
+        rendered[output_path] = card
+    if not write_files:
+        print(f"カード（{label}）を生成しました（メモリ）: {os.path.basename(output_path)}")
+        return None
+    return generator.encoder.submit_call(_save_card, generator, card, output_path, timer)
+
+def process_row(generator, row, output_dir, rendered=None, write_files=True, timer=None):
+    """1行分のフル・ハーフカードを生成してログ行を返す
+
+    rendered に辞書を渡すと {保存パス: カード画像} を追加する（ページ生成へのメモリ渡し用）。
+    timer（RowTimer）を渡すと段階ごとの時間を記録する。
+    """
     try:
+        if len(row) < 5:  # 必要な列数をチェック
+            return row + ["エラー", "データ列が不足しています"]
+
         item_code = row[0]
         image_path = row[1]
         product_name = row[2]
         color_jp = row[3]
         color_en = row[4]
-        page_product_name = row[5]
         
         status = "正常"
         error_log = ""
         
-        if not os.path.exists(image_path):
+        source_path = generator.source_image_path(image_path)
+        with timed(timer, "exists"):
+            found = os.path.exists(source_path)
+        if not found:
             return row + ["エラー", f"画像ファイルが見つかりません: {image_path}"]
             
+        # 商品画像を1回だけデコードし、フル・ハーフ両方の画像を作る
+        product_images = generator.load_product_images(source_path, timer=timer)
+        saving = []  # (ラベル, 保存パス, Future)
+
         # フルサイズカード生成
         full_card = generator.create_card(
-            image_path, product_name, color_jp, color_en, item_code, size="full"
-        )
+            source_path, product_name, color_jp, color_en, item_code, size="full",
+            product_image=product_images["full"], timer=timer
+        ) if product_images else None
         if full_card:
-            output_path = os.path.join(output_dir, f"{item_code}-{product_name}_{color_jp}_full.png")
-            full_card.save(output_path)
-            print(f"カード（オール）を生成しました: {output_path}")
+            output_path = card_image_path(output_dir, item_code, product_name, color_jp, "full", generator.encoder.extension)
+            saving.append(("オール", output_path, _output_card(generator, full_card, output_path, "オール", rendered, write_files, timer)))
         else:
             status = "エラー"
             error_log = "フルサイズカードの生成に失敗しました"
             
-        # ハーフサイズカード生成
+        # ハーフサイズカード生成（フルサイズのエンコードと並行して描画する）
         half_card = generator.create_card(
-            image_path, product_name, color_jp, color_en, item_code, size="half"
-        )
+            source_path, product_name, color_jp, color_en, item_code, size="half",
+            product_image=product_images["half"], timer=timer
+        ) if product_images else None
         if half_card:
-            output_path = os.path.join(output_dir, f"{item_code}-{product_name}_{color_jp}_half.png")
-            half_card.save(output_path)
-            print(f"カード（ハーフ）を生成しました: {output_path}")
+            output_path = card_image_path(output_dir, item_code, product_name, color_jp, "half", generator.encoder.extension)
+            saving.append(("ハーフ", output_path, _output_card(generator, half_card, output_path, "ハーフ", rendered, write_files, timer)))
         else:
             status = "エラー"
             error_log += ", ハーフサイズカードの生成に失敗しました" if error_log else "ハーフサイズカードの生成に失敗しました"
+
+        # 保存の完了を待つ
+        for label, output_path, future in saving:
+            if future is None:
+                continue
+            try:
+                future.result()
+                print(f"カード（{label}）を生成しました: {output_path}")
+            except Exception as e:
+                status = "エラー"
+                message = f"カード（{label}）の保存に失敗しました: {str(e)}"
+                error_log += f", {message}" if error_log else message
             
         return row + [status, error_log]
     except Exception as e:
         return row + ["エラー", f"処理中にエラーが発生: {str(e)}"]
 
-def detect_encoding(file_path):
-    with open(file_path, 'rb') as f:
-        raw_data = f.read()
-    result = chardet.detect(raw_data)
-    return result['encoding']
+def run_row(generator, index, row, output_dir, rendered=None, write_files=True, instrumentation=None):
+    """process_row を計測付きで実行し、(ログ行, 計測結果) を返す（計測しない場合は計測結果が None）"""
+    if instrumentation is None:
+        return process_row(generator, row, output_dir, rendered, write_files), None
+
+    timer = instrumentation.new_timer()
+    timings = {}
+    start = time.perf_counter()
+    if instrumentation.wants_profile(index + 1):
+        result, timings["profile"] = instrumentation.profile(
+            f"row{index + 1:06d}", process_row, generator, row, output_dir, rendered, write_files, timer
+        )
+    else:
+        result = process_row(generator, row, output_dir, rendered, write_files, timer)
+    timings["wall_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    timings["ms"] = timer.as_dict() if timer is not None else {}
+    return result, timings
+
+def print_cache_stats(stats_list):
+    """cache_stats() の結果（プロセスごと）を合算して表示する"""
+    suffix = f"（{len(stats_list)}プロセス合計）" if len(stats_list) > 1 else ""
+    for name in ("画像キャッシュ", "テキストキャッシュ"):
+        merged = merge_stats(stats[name] for stats in stats_list)
+        print(f"{name}{suffix}: {format_stats(merged)}")
+    encode_stats = merge_encode_stats(stats["エンコード"] for stats in stats_list)
+    print(f"カードのエンコード{suffix}: {format_encode_stats(encode_stats)}")
+
+# ワーカープロセスごとのジェネレーター（フォントはプロセス起動時に1回だけ読み込む）
+_worker_generator = None
+
+def _init_worker(generator_kwargs):
+    global _worker_generator
+    _worker_generator = ProductCardGenerator(**generator_kwargs)
+
+def _process_row_in_worker(item, output_dir, keep_cards=False, write_files=True, instrumentation=None):
+    index, row = item
+    rendered = {} if keep_cards else None
+    result, timings = run_row(_worker_generator, index, row, output_dir, rendered, write_files, instrumentation)
+    return index, result, timings, os.getpid(), _worker_generator.cache_stats(), rendered, peak_rss_bytes()
 
 def main():
+    from tkinter import filedialog
+    configure_fonts(load_settings().get("font_dirs") or None)
     csv_path = filedialog.askopenfilename(title="CSVファイルを選択", filetypes=[("CSV files", "*.csv")])
     if not csv_path:
         print("CSVファイルが選択されませんでした。")
@@ -398,27 +548,16 @@ def main():
     log_dir = "log"
     os.makedirs(log_dir, exist_ok=True)
     
-    # エンコーディング自動検出
-    encoding = detect_encoding(csv_path)
-    if not encoding:
-        encoding = 'shift_jis'  # フォールバック
-    
-    # CSVを読み込み
+    # CSVを読み込み（エンコーディングは先頭から自動検出、行は読みながら処理）
     rows = []
-    with open(csv_path, 'r', encoding=encoding) as f:
-        reader = csv.reader(f)
-        header = next(reader)
-        # ヘッダーを修正
-        header = ["商品コード", "画像パス", "商品名", "カラー名", "カラー名(英語)", "ページ商品名", "ステータス", "エラーログ"]
-        rows.append(header)
-        
-        data_rows = list(reader)
+    _, data_rows = read_csv(csv_path)
+    # ヘッダーを修正
+    header = ["商品コード", "画像パス", "商品名", "カラー名", "カラー名(英語)", "ページ商品名", "ステータス", "エラーログ"]
+    rows.append(header)
     
     # 画像生成の並列処理
     generator = ProductCardGenerator()
-    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-        process_func = functools.partial(process_row, generator, output_dir=output_dir)
-        results = list(executor.map(lambda row: process_func(row), data_rows))
+    results = generator.process_csv_data(data_rows, output_dir, workers=os.cpu_count())
     
     rows.extend(results)
     
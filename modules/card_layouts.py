@@ -1,283 +1,204 @@
+import math
 import dataclasses
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 
-@dataclasses.dataclass
+# 自動パターン選択のルール
+#   first : get_layouts_for_count の先頭パターン（GUIの初期選択と同じ）
+#   full  : フルサイズのカードが最も多いパターン
+#   half  : フルサイズのカードが最も少ないパターン
+#   上記以外は "pattern2" のようなパターンIDとして扱い、無ければ first にフォールバック
+PATTERN_RULES = ("first", "full", "half")
+
+@dataclasses.dataclass(frozen=True)
 class CardLayout:
     name: str  # パターン名
     description: str  # パターンの説明
-    positions: List[Tuple[int, int]]  # 各カードの位置 [(x, y), ...]
-    sizes: List[str]  # 各カードのサイズ ['full' or 'half', ...]
+    positions: Tuple[Tuple[int, int], ...]  # 各カードの位置 ((x, y), ...)
+    sizes: Tuple[str, ...]  # 各カードのサイズ ('full' or 'half', ...)
+
+@dataclasses.dataclass(frozen=True)
+class LayoutRule:
+    """配置パターンの宣言
+
+    kind ごとの並べ方:
+      full_row  : フルサイズを横一列に並べて中央揃え
+      full_grid : 左にフルサイズ1枚、右にハーフサイズを cols 列の格子状に並べ、全体を中央揃え
+      grid      : ハーフサイズを cols 列の格子状に並べ、全体を中央揃え
+      rows      : ハーフサイズを行ごとの枚数（row_counts）で並べ、行ごとに中央揃え
+    """
+    name: str
+    description: str
+    kind: str
+    cols: int = 0
+    row_counts: Tuple[int, ...] = ()
+
+# 枚数ごとの配置パターン（先頭がGUIの初期選択）。ここに無い枚数は自動のパターンを使う
+LAYOUT_RULES: Dict[int, Dict[str, LayoutRule]] = {
+    1: {"pattern1": LayoutRule("パターン1", "フルサイズ1枚を中央配置", "full_row")},
+    2: {"pattern1": LayoutRule("パターン1", "フルサイズ2枚を横並び", "full_row")},
+    3: {"pattern1": LayoutRule("パターン1", "フルサイズ1枚 + ハーフサイズ2枚（右側縦並び）", "full_grid", cols=1)},
+    4: {
+        "pattern1": LayoutRule("パターン1", "フルサイズ1枚 + ハーフサイズ3枚（右側格子状）", "full_grid", cols=2),
+        "pattern2": LayoutRule("パターン2", "ハーフサイズ4枚を2×2で配置（中央）", "grid", cols=2),
+    },
+    5: {"pattern1": LayoutRule("パターン1", "フルサイズ1枚 + ハーフサイズ4枚（右側格子状）", "full_grid", cols=2)},
+    6: {"pattern1": LayoutRule("パターン1", "ハーフサイズ6枚を3×2で配置", "grid", cols=3)},
+    7: {"pattern1": LayoutRule("パターン1", "ハーフサイズ7枚を4+3で配置", "rows", row_counts=(4, 3))},
+    8: {"pattern1": LayoutRule("パターン1", "ハーフサイズ8枚を4×2で配置", "grid", cols=4)},
+}
+
+# 計算済みの配置（(枚数, パターンID, ページ・カードの寸法) -> CardLayout）。プロセス内で共有する
+_layout_cache: Dict[Tuple[int, str, Tuple[int, ...]], Optional[CardLayout]] = {}
+
+def select_layout(layouts: Dict[str, CardLayout], rule: str = "first") -> Tuple[Optional[str], Optional[CardLayout]]:
+    """ルールに従って配置パターンを1つ選ぶ（(パターンID, CardLayout) を返す）"""
+    if not layouts:
+        return None, None
+
+    if rule == "full":
+        pattern_id = max(layouts, key=lambda k: layouts[k].sizes.count('full'))
+    elif rule == "half":
+        pattern_id = min(layouts, key=lambda k: layouts[k].sizes.count('full'))
+    elif rule in layouts:
+        pattern_id = rule
+    else:
+        pattern_id = next(iter(layouts.keys()))
+    return pattern_id, layouts[pattern_id]
 
 class CardLayoutManager:
-    def __init__(self):
+    def __init__(self, a4_width: int = 3508, a4_height: int = 2480):
         # A4サイズ（300dpi、横）
-        self.a4_width = 3508
-        self.a4_height = 2480
-        
+        self.a4_width = a4_width
+        self.a4_height = a4_height
+
         # カードサイズ定義（300dpi）
         self.full_width = 1704  # フルサイズの幅
         self.full_height = 2000  # フルサイズの高さ
         self.half_width = 852   # ハーフサイズの幅
         self.half_height = 1000 # ハーフサイズの高さ
-        
+
         # 余白
         self.margin_top = 400
 
-    def get_layouts_for_count(self, num_cards: int) -> Dict[str, CardLayout]:
-        """指定されたカード枚数に対応する配置パターンを返す"""
-        if num_cards == 4:
-            return {
-                "pattern1": self._get_layout_4cards_pattern1(),
-                "pattern2": self._get_layout_4cards_pattern2(),
-            }
-        elif num_cards == 3:
-            return {
-                "pattern1": self._get_layout_3cards(),
-            }
-        elif num_cards == 2:
-            return {
-                "pattern1": self._get_layout_2cards(),
-            }
-        elif num_cards == 1:
-            return {
-                "pattern1": self._get_layout_1card(),
-            }
-        elif num_cards == 5:
-            return {
-                "pattern1": self._get_layout_5cards(),
-            }
-        elif num_cards == 6:
-            return {
-                "pattern1": self._get_layout_6cards(),
-            }
-        elif num_cards == 7:
-            return {
-                "pattern1": self._get_layout_7cards(),
-            }
-        elif num_cards == 8:
-            return {
-                "pattern1": self._get_layout_8cards(),
-            }
-        return {}
-
-    def _get_layout_4cards_pattern1(self) -> CardLayout:
-        """4枚パターン1: フル1枚 + ハーフ3枚"""
-        # フル画像1枚 + 残りをハーフサイズで配置
-        num_half = 3
-        num_half_cols = 2  # ハーフサイズ画像の列数
+    def geometry(self) -> Tuple[int, ...]:
+        """配置の計算に使う寸法（キャッシュのキー）"""
+        return (self.a4_width, self.a4_height, self.full_width, self.full_height,
+                self.half_width, self.half_height, self.margin_top)
+
+    def half_capacity(self) -> Tuple[int, int]:
+        """1ページに並べられるハーフサイズの (列数, 行数)"""
+        return (self.a4_width // self.half_width,
+                max(0, (self.a4_height - self.margin_top) // self.half_height))
+
+    def max_cards_per_page(self) -> int:
+        cols, rows = self.half_capacity()
+        return cols * rows
+
+    def rules_for_count(self, num_cards: int) -> Dict[str, LayoutRule]:
+        """枚数に対応する配置パターンの宣言（表に無い枚数はハーフサイズの自動配置）"""
+        if num_cards in LAYOUT_RULES:
+            return LAYOUT_RULES[num_cards]
+        if num_cards < 1 or num_cards > self.max_cards_per_page():
+            return {}
+        max_cols, _ = self.half_capacity()
+        num_rows = math.ceil(num_cards / max_cols)
+        cols = math.ceil(num_cards / num_rows)
+        if num_cards % cols == 0:
+            rule = LayoutRule("パターン1", f"ハーフサイズ{num_cards}枚を{cols}×{num_rows}で配置", "grid", cols=cols)
+        else:
+            # 行ごとの枚数をなるべく揃え、多い行を上にする
+            row_counts = tuple(num_cards // num_rows + (1 if i < num_cards % num_rows else 0) for i in range(num_rows))
+            rule = LayoutRule("パターン1", f"ハーフサイズ{num_cards}枚を{'+'.join(map(str, row_counts))}で配置",
+                              "rows", row_counts=row_counts)
+        return {"pattern1": rule}
 
+    def get_layouts_for_count(self, num_cards: int) -> Dict[str, CardLayout]:
+        """指定されたカード枚数に対応する配置パターンを返す（1ページに収まらない枚数は空）"""
+        layouts = {}
+        for pattern_id, rule in self.rules_for_count(num_cards).items():
+            key = (num_cards, pattern_id, self.geometry())
+            if key not in _layout_cache:
+                _layout_cache[key] = self._build_layout(rule, num_cards)
+            if _layout_cache[key] is not None:
+                layouts[pattern_id] = _layout_cache[key]
+        return layouts
+
+    def paginate(self, num_cards: int) -> List[int]:
+        """1ページに収まらない枚数を、枚数がなるべく揃うように複数ページへ分ける（各ページの枚数を返す）"""
+        per_page = self.max_cards_per_page()
+        if num_cards <= per_page or per_page == 0:
+            return [num_cards]
+        num_pages = math.ceil(num_cards / per_page)
+        return [num_cards // num_pages + (1 if i < num_cards % num_pages else 0) for i in range(num_pages)]
+
+    def _build_layout(self, rule: LayoutRule, num_cards: int) -> Optional[CardLayout]:
+        if rule.kind == "full_row":
+            positions, sizes = self._full_row(num_cards)
+        elif rule.kind == "full_grid":
+            positions, sizes = self._full_grid(num_cards - 1, rule.cols)
+        elif rule.kind == "grid":
+            positions, sizes = self._half_grid(num_cards, rule.cols)
+        elif rule.kind == "rows":
+            positions, sizes = self._half_rows(rule.row_counts)
+        else:
+            raise ValueError(f"未対応の配置の種類です: {rule.kind}")
+
+        # ページからはみ出す配置は使わない
+        if len(positions) != num_cards or not self._fits(positions, sizes):
+            return None
+        return CardLayout(name=rule.name, description=rule.description,
+                          positions=tuple(positions), sizes=tuple(sizes))
+
+    def _card_size(self, size: str) -> Tuple[int, int]:
+        return (self.full_width, self.full_height) if size == 'full' else (self.half_width, self.half_height)
+
+    def _fits(self, positions, sizes) -> bool:
+        for (x, y), size in zip(positions, sizes):
+            width, height = self._card_size(size)
+            if x < 0 or y < 0 or x + width > self.a4_width or y + height > self.a4_height:
+                return False
+        return True
+
+    def _center_offset(self, total_width: int) -> int:
+        # 中央寄せのためのオフセット
+        return int((self.a4_width - total_width) / 2)
+
+    def _full_row(self, num_full: int):
+        """フルサイズを横一列に並べて中央揃え"""
+        center_offset = self._center_offset(self.full_width * num_full)
+        positions = [(center_offset + i * self.full_width, self.margin_top) for i in range(num_full)]
+        return positions, ['full'] * num_full
+
+    def _full_grid(self, num_half: int, num_half_cols: int):
+        """左にフルサイズ1枚、右にハーフサイズを格子状に配置"""
         # 全体の幅を計算（フル幅 + ハーフ幅 * 列数）
-        total_width = self.full_width + self.half_width * num_half_cols
-        # 中央寄せのためのオフセットを計算
-        center_offset = int((self.a4_width - total_width) / 2)
-
-        # フル画像の位置（左側）
+        center_offset = self._center_offset(self.full_width + self.half_width * num_half_cols)
         positions = [(center_offset, self.margin_top)]
         sizes = ['full']
 
-        # ハーフ画像の位置（右側に格子状に配置）
         half_start_x = center_offset + self.full_width
         for i in range(num_half):
             col = i % num_half_cols
             row = i // num_half_cols
-            x = half_start_x + col * self.half_width
-            y = self.margin_top + row * self.half_height
-            positions.append((x, y))
+            positions.append((half_start_x + col * self.half_width, self.margin_top + row * self.half_height))
             sizes.append('half')
+        return positions, sizes
 
-        return CardLayout(
-            name="パターン1",
-            description="フルサイズ1枚 + ハーフサイズ3枚（右側格子状）",
-            positions=positions,
-            sizes=sizes
-        )
-
-    def _get_layout_4cards_pattern2(self) -> CardLayout:
-        """4枚パターン2: ハーフ4枚を2x2で配置"""
-        num_cols = 2
-        num_rows = 2
-        total_width = self.half_width * num_cols
-        center_offset_x = int((self.a4_width - total_width) / 2)
-
+    def _half_grid(self, num_half: int, num_cols: int):
+        """ハーフサイズを num_cols 列の格子状に並べ、全体を中央揃え"""
+        center_offset_x = self._center_offset(self.half_width * num_cols)
         positions = []
-        sizes = []
-        for i in range(4):
-            col = i % num_cols
-            row = i // num_cols
-            x = center_offset_x + col * self.half_width
-            y = self.margin_top + row * self.half_height
-            positions.append((x, y))
-            sizes.append('half')
-
-        return CardLayout(
-            name="パターン2",
-            description="ハーフサイズ4枚を2×2で配置（中央）",
-            positions=positions,
-            sizes=sizes
-        )
-
-    def _get_layout_3cards(self) -> CardLayout:
-        """3枚: フル1枚 + ハーフ2枚"""
-        # 全体の幅を計算（フル幅 + ハーフ幅）
-        total_width = self.full_width + self.half_width
-        # 中央寄せのためのオフセットを計算
-        center_offset = int((self.a4_width - total_width) / 2)
-        
-        # フル画像とハーフ画像の位置を計算
-        x1 = center_offset  # フル画像の開始位置
-        x2 = x1 + self.full_width  # ハーフ画像の開始位置（フル画像の直後）
-        
-        positions = [
-            (x1, self.margin_top),  # 左（フル）
-            (x2, self.margin_top),  # 右上（ハーフ）
-            (x2, self.margin_top + self.half_height)  # 右下（ハーフ）
-        ]
-        sizes = ['full', 'half', 'half']
-
-        return CardLayout(
-            name="パターン1",
-            description="フルサイズ1枚 + ハーフサイズ2枚（右側縦並び）",
-            positions=positions,
-            sizes=sizes
-        )
-
-    def _get_layout_2cards(self) -> CardLayout:
-        """2枚: フル2枚を横に並べて中央揃え"""
-        total_width = self.full_width * 2
-        center_offset = int((self.a4_width - total_width) / 2)
-        positions = [
-            (center_offset, self.margin_top),
-            (center_offset + self.full_width, self.margin_top)
-        ]
-        sizes = ['full', 'full']
-
-        return CardLayout(
-            name="パターン1",
-            description="フルサイズ2枚を横並び",
-            positions=positions,
-            sizes=sizes
-        )
-
-    def _get_layout_1card(self) -> CardLayout:
-        """1枚: フル1枚を中央配置"""
-        positions = [(int((self.a4_width - self.full_width) / 2), self.margin_top)]
-        sizes = ['full']
-
-        return CardLayout(
-            name="パターン1",
-            description="フルサイズ1枚を中央配置",
-            positions=positions,
-            sizes=sizes
-        )
-
-    def _get_layout_5cards(self) -> CardLayout:
-        """5枚: フル1枚 + ハーフ4枚"""
-        # フル画像1枚 + 残りをハーフサイズで配置
-        num_half = 4
-        num_half_cols = 2  # ハーフサイズ画像の列数
-
-        # 全体の幅を計算（フル幅 + ハーフ幅 * 列数）
-        total_width = self.full_width + self.half_width * num_half_cols
-        # 中央寄せのためのオフセットを計算
-        center_offset = int((self.a4_width - total_width) / 2)
-
-        # フル画像の位置（左側）
-        positions = [(center_offset, self.margin_top)]
-        sizes = ['full']
-
-        # ハーフ画像の位置（右側に格子状に配置）
-        half_start_x = center_offset + self.full_width
         for i in range(num_half):
-            col = i % num_half_cols
-            row = i // num_half_cols
-            x = half_start_x + col * self.half_width
-            y = self.margin_top + row * self.half_height
-            positions.append((x, y))
-            sizes.append('half')
-
-        return CardLayout(
-            name="パターン1",
-            description="フルサイズ1枚 + ハーフサイズ4枚（右側格子状）",
-            positions=positions,
-            sizes=sizes
-        )
-
-    def _get_layout_6cards(self) -> CardLayout:
-        """6枚: ハーフ6枚を3x2で配置"""
-        num_cols = 3
-        num_rows = 2
-        total_width = self.half_width * num_cols
-        center_offset_x = int((self.a4_width - total_width) / 2)
-
-        positions = []
-        sizes = []
-        for i in range(6):
             col = i % num_cols
             row = i // num_cols
-            x = center_offset_x + col * self.half_width
-            y = self.margin_top + row * self.half_height
-            positions.append((x, y))
-            sizes.append('half')
-
-        return CardLayout(
-            name="パターン1",
-            description="ハーフサイズ6枚を3×2で配置",
-            positions=positions,
-            sizes=sizes
-        )
-
-    def _get_layout_7cards(self) -> CardLayout:
-        """7枚: ハーフ7枚を4+3で配置"""
-        # 上段4枚
-        total_width = self.half_width * 4
-        center_offset_x = int((self.a4_width - total_width) / 2)
+            positions.append((center_offset_x + col * self.half_width, self.margin_top + row * self.half_height))
+        return positions, ['half'] * num_half
 
+    def _half_rows(self, row_counts: Tuple[int, ...]):
+        """ハーフサイズを行ごとの枚数で並べ、行ごとに中央揃え"""
         positions = []
-        sizes = []
-
-        # 上段4枚
-        for i in range(4):
-            x = center_offset_x + i * self.half_width
-            y = self.margin_top
-            positions.append((x, y))
-            sizes.append('half')
-
-        # 下段3枚
-        total_width = self.half_width * 3
-        center_offset_x = int((self.a4_width - total_width) / 2)
-        for i in range(3):
-            x = center_offset_x + i * self.half_width
-            y = self.margin_top + self.half_height
-            positions.append((x, y))
-            sizes.append('half')
-
-        return CardLayout(
-            name="パターン1",
-            description="ハーフサイズ7枚を4+3で配置",
-            positions=positions,
-            sizes=sizes
-        )
-
-    def _get_layout_8cards(self) -> CardLayout:
-        """8枚: ハーフ8枚を4x2で配置"""
-        num_cols = 4
-        num_rows = 2
-        total_width = self.half_width * num_cols
-        center_offset_x = int((self.a4_width - total_width) / 2)
-
-        positions = []
-        sizes = []
-        for i in range(8):
-            col = i % num_cols
-            row = i // num_cols
-            x = center_offset_x + col * self.half_width
-            y = self.margin_top + row * self.half_height
-            positions.append((x, y))
-            sizes.append('half')
-
-        return CardLayout(
-            name="パターン1",
-            description="ハーフサイズ8枚を4×2で配置",
-            positions=positions,
-            sizes=sizes
-        ) 
\ No newline at end of file
+        for row, count in enumerate(row_counts):
+            center_offset_x = self._center_offset(self.half_width * count)
+            for i in range(count):
+                positions.append((center_offset_x + i * self.half_width, self.margin_top + row * self.half_height))
+        return positions, ['half'] * sum(row_counts)
@@ -0,0 +1,73 @@
+import threading
+import dataclasses
+from typing import Dict, Tuple
+from PIL import Image
+
+@dataclasses.dataclass(frozen=True)
+class TextSlot:
+    field: str  # 描画する項目（'item_code', 'product_name', 'color_jp', 'color_en'）
+    font: str  # CardSpec.fonts のフォント名
+    xy: Tuple[int, int]  # 中央揃え（anchor="mm"）の基準位置
+
+@dataclasses.dataclass(frozen=True)
+class CardSpec:
+    """カード1サイズ分の寸法・文字位置・フォントサイズ（変更しない、プロセス内で共有する）"""
+    name: str  # サイズ名（'full', 'half'）
+    card_size: Tuple[int, int]  # カードの (幅, 高さ)
+    image_xy: Tuple[int, int]  # 商品画像の左上
+    image_size: Tuple[int, int]  # 商品画像の枠の (幅, 高さ)
+    fonts: Tuple[Tuple[str, str, int], ...]  # ((フォント名, 用途, サイズpx), ...)
+    texts: Tuple[TextSlot, ...]  # 描画順（後の文字が上に重なる）
+
+    def blank_card(self):
+        """何も描いていないカードの下地（共有するので copy() してから描く）"""
+        with _blank_cards_lock:
+            card = _blank_cards.get(self.card_size)
+            if card is None:
+                card = Image.new('RGB', self.card_size, 'white')
+                _blank_cards[self.card_size] = card
+            return card
+
+# カードサイズごとの下地（(幅, 高さ) -> Image）
+_blank_cards: Dict[Tuple[int, int], Image.Image] = {}
+_blank_cards_lock = threading.Lock()
+
+# カードサイズの定義（300dpi）。新しいサイズはここに CardSpec を追加する
+CARD_SPECS: Dict[str, CardSpec] = {
+    # オールサイズ
+    "full": CardSpec(
+        name="full",
+        card_size=(1704, 2000),
+        image_xy=(57, 60),
+        image_size=(1582, 1582),
+        fonts=(
+            ("normal", "regular", 50),  # 12pt → 50px
+            ("large", "bold", 83),  # 20pt → 83px
+            ("number", "regular", 33),  # 8pt → 33px
+        ),
+        texts=(
+            TextSlot("item_code", "number", (852, 1956)),  # センター（カラー英字と同じ）
+            TextSlot("product_name", "normal", (852, 1710)),  # 画像下部（95+1582=1677）から少し下
+            TextSlot("color_en", "large", (852, 1893)),
+            TextSlot("color_jp", "normal", (852, 1829)),
+        ),
+    ),
+    # ハーフサイズ
+    "half": CardSpec(
+        name="half",
+        card_size=(852, 1000),
+        image_xy=(60, 60),
+        image_size=(730, 730),
+        fonts=(
+            ("normal", "regular", 42),  # 10pt → 42px
+            ("large", "bold", 67),  # 16pt → 67px
+            ("number", "regular", 33),  # 8pt → 33px
+        ),
+        texts=(
+            TextSlot("item_code", "number", (426, 956)),  # カラー英字（y=896）の下（896+33+10）
+            TextSlot("product_name", "normal", (426, 790)),
+            TextSlot("color_en", "large", (426, 896)),
+            TextSlot("color_jp", "normal", (426, 849)),
+        ),
+    ),
+}
@@ -0,0 +1,86 @@
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+from .image_cache import estimate_image_bytes
+
+class CardStore:
+    """生成済みカード画像をメモリに保持し、カード生成からページ生成へ直接渡すためのストア
+
+    キーはカード画像の保存パス（card_image_path の結果）。メモリ上限を超えた分は
+    最も古いカードから破棄し、今回の実行でまだ保存していないカードは encoder（OutputEncoder）の設定で
+    書き出してからメモリを空ける（前回の実行のファイルが残っていても上書きする）。
+    カード生成とページ生成は既定で並行する（--no-stream-pages で無効）ため、別スレッドから使うのでロックで守る。
+    """
+
+    def __init__(self, max_bytes=2 * 1024 * 1024 * 1024, encoder=None):
+        self.max_bytes = max_bytes
+        self.encoder = encoder
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # path -> (image, nbytes, 保存済みか)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, path):
+        with self._lock:
+            return path in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def put(self, path, image, saved=False):
+        """カードを保持する（saved=True はカード生成で同じ内容をファイルにも保存済みのもの）"""
+        with self._lock:
+            self._put(path, image, saved)
+
+    def _put(self, path, image, saved):
+        if path in self._entries:
+            _, nbytes, _ = self._entries.pop(path)
+            self.current_bytes -= nbytes
+        nbytes = estimate_image_bytes(image)
+        self._entries[path] = (image, nbytes, saved)
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes and self._entries:
+            self._spill(next(iter(self._entries)))
+
+    def get(self, path):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[0]
+
+    def _spill(self, path):
+        image, nbytes, saved = self._entries.pop(path)
+        self.current_bytes -= nbytes
+        self.evictions += 1
+        # ページ生成でファイルから読めるよう、未保存なら書き出しておく（残っている古いファイルは使わない）
+        if not saved:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # 途中で落ちても書きかけのカードが残らないよう一時ファイルから置き換える
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            if self.encoder is not None:
+                self.encoder.save(image, tmp_path, quantize=True)
+            else:
+                image.save(tmp_path, format=Image.registered_extensions().get(os.path.splitext(path)[1].lower()))
+            os.replace(tmp_path, path)
+
+    def stats(self):
+        with self._lock:
+            return self._stats()
+
+    def _stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
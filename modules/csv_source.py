@@ -0,0 +1,52 @@
+import csv
+
+# エンコーディング判定に使う先頭のバイト数
+SAMPLE_BYTES = 64 * 1024
+CHUNK_BYTES = 8 * 1024
+
+# 判定結果をより広い互換エンコーディングに置き換える
+#   SHIFT_JIS -> cp932（NECやIBMの拡張文字を含むExcel出力に対応）
+ENCODING_ALIASES = {
+    "shift_jis": "cp932",
+}
+
+def detect_encoding(file_path, sample_bytes=SAMPLE_BYTES, fallback="shift_jis"):
+    """ファイル先頭の sample_bytes までを逐次判定してエンコーディングを返す
+
+    ASCIIだけのチャンクは判定に渡さないが、読んだ量には数える。先頭 sample_bytes がASCIIだけなら
+    後ろの日本語を読めるよう fallback（Excel出力の Shift_JIS、cp932 として読む）にする。
+    """
+    # chardet は読み込みに時間がかかるので、判定が必要になったときだけ読み込む
+    from chardet.universaldetector import UniversalDetector
+    detector = UniversalDetector()
+    with open(file_path, 'rb') as f:
+        read = 0
+        fed = 0
+        while read < sample_bytes and not detector.done:
+            chunk = f.read(min(CHUNK_BYTES, sample_bytes - read))
+            if not chunk:
+                break
+            read += len(chunk)
+            if fed == 0 and chunk.isascii():
+                # ASCIIだけのチャンクは判定に寄与しないので読み飛ばす
+                continue
+            detector.feed(chunk)
+            fed += len(chunk)
+    detector.close()
+
+    # 何も渡していない（ASCIIだけ）と chardet は utf-8 などを返すので使わない
+    encoding = (detector.result['encoding'] if fed else None) or fallback
+    return ENCODING_ALIASES.get(encoding.lower(), encoding)
+
+def iter_csv_rows(file_path, encoding=None):
+    """CSVの行（ヘッダーを含む）を先頭から1行ずつ返すジェネレーター"""
+    if encoding is None:
+        encoding = detect_encoding(file_path)
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        yield from csv.reader(f)
+
+def read_csv(file_path, encoding=None):
+    """(ヘッダー, データ行のジェネレーター) を返す（データ行は読みながら処理できる）"""
+    rows = iter_csv_rows(file_path, encoding)
+    header = next(rows, [])
+    return header, rows
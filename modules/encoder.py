@@ -0,0 +1,171 @@
+import io
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from .timing import timed
+
+# settings.json の image_format -> (Pillowのフォーマット名, 拡張子)
+IMAGE_FORMATS = {
+    "png": ("PNG", ".png"),
+    "jpeg": ("JPEG", ".jpg"),
+    "jpg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+}
+
+class OutputEncoder:
+    """カード・ページ画像の保存形式と圧縮設定をまとめたエンコーダー
+
+    エンコード（PNGのzlib圧縮やJPEG/WebP変換）はGILを解放するため、
+    submit() で別スレッドに回すと次の描画と並行して進む。
+    形式ごとの枚数・時間・出力サイズを記録する。
+    """
+
+    def __init__(self, image_format="png", png_compress_level=6, jpeg_quality=90, webp_quality=90,
+                 webp_method=4, palette_colors=0, encode_workers=2):
+        image_format = image_format.lower()
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"未対応の画像形式です: {image_format}（{' / '.join(IMAGE_FORMATS)}）")
+        self.image_format = image_format
+        self.png_compress_level = png_compress_level
+        self.jpeg_quality = jpeg_quality
+        self.webp_quality = webp_quality
+        self.webp_method = webp_method
+        self.palette_colors = palette_colors  # カードの減色（0なら減色しない、JPEGでは無視）
+        self.encode_workers = encode_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            image_format=settings.get("image_format", "png"),
+            png_compress_level=settings.get("png_compress_level", 6),
+            jpeg_quality=settings.get("jpeg_quality", 90),
+            webp_quality=settings.get("webp_quality", 90),
+            webp_method=settings.get("webp_method", 4),
+            palette_colors=settings.get("card_palette_colors", 0),
+            encode_workers=settings.get("encode_workers", 2),
+        )
+
+    def __getstate__(self):
+        # プロセス間で渡すときは設定だけ（スレッドプール・統計は持ち込まない）
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_lock"] = None
+        state["_stats"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def pil_format(self):
+        return IMAGE_FORMATS[self.image_format][0]
+
+    @property
+    def extension(self):
+        return IMAGE_FORMATS[self.image_format][1]
+
+    def settings(self):
+        """出力結果に影響する設定値（レンダーキャッシュのキー用）"""
+        return {
+            "image_format": self.pil_format,
+            "png_compress_level": self.png_compress_level,
+            "jpeg_quality": self.jpeg_quality,
+            "webp_quality": self.webp_quality,
+            "webp_method": self.webp_method,
+            "palette_colors": self.palette_colors,
+        }
+
+    def _save_options(self):
+        if self.pil_format == "PNG":
+            return {"compress_level": self.png_compress_level}
+        if self.pil_format == "JPEG":
+            return {"quality": self.jpeg_quality, "optimize": False}
+        return {"quality": self.webp_quality, "method": self.webp_method}
+
+    def save(self, image, path, quantize=False, timer=None):
+        """画像を設定どおりに保存し、(秒数, バイト数) を返す
+
+        timer（RowTimer）を渡すと、メモリ上へのエンコードと書き込みを分けて計測する。
+        """
+        start = time.perf_counter()
+        with timed(timer, "encode"):
+            if self.pil_format == "JPEG":
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+            elif quantize and self.palette_colors:
+                from PIL import Image
+                image = image.quantize(colors=self.palette_colors, method=Image.Quantize.FASTOCTREE)
+            if timer is None:
+                image.save(path, self.pil_format, **self._save_options())
+            else:
+                buffer = io.BytesIO()
+                image.save(buffer, self.pil_format, **self._save_options())
+        if timer is not None:
+            with timer.stage("save"):
+                with open(path, 'wb') as f:
+                    f.write(buffer.getbuffer())
+        elapsed = time.perf_counter() - start
+        nbytes = os.path.getsize(path)
+
+        with self._lock:
+            stats = self._stats.setdefault(self.image_format, {"count": 0, "seconds": 0.0, "bytes": 0})
+            stats["count"] += 1
+            stats["seconds"] += elapsed
+            stats["bytes"] += nbytes
+        return elapsed, nbytes
+
+    def submit(self, image, path, quantize=False, timer=None):
+        """別スレッドで保存する（完了を待つFutureを返す）"""
+        return self.submit_call(self.save, image, path, quantize, timer)
+
+    def submit_call(self, fn, *args):
+        """保存処理 fn(*args) をエンコード用スレッドで実行する（encode_workers=0 ならその場で実行）"""
+        if self.encode_workers <= 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.encode_workers)
+        return self._executor.submit(fn, *args)
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+def merge_encode_stats(stats_list):
+    """複数プロセス・複数タスクのエンコード統計を合算する"""
+    merged = {}
+    for stats in stats_list:
+        for name, values in stats.items():
+            total = merged.setdefault(name, {"count": 0, "seconds": 0.0, "bytes": 0})
+            for key in total:
+                total[key] += values[key]
+    return merged
+
+def subtract_encode_stats(after, before):
+    """エンコード統計の差分（after - before、同じエンコーダーで1回分の処理だけを数える）"""
+    delta = {}
+    for name, values in after.items():
+        previous = before.get(name, {})
+        counts = {key: value - previous.get(key, 0) for key, value in values.items()}
+        if counts["count"]:
+            delta[name] = counts
+    return delta
+
+def format_encode_stats(stats):
+    lines = []
+    for name, values in sorted(stats.items()):
+        count = values["count"] or 1
+        lines.append(
+            f"{name}: {values['count']}枚 {values['seconds']:.1f}秒（平均 {values['seconds'] / count * 1000:.0f}ms/枚）, "
+            f"合計 {values['bytes'] / 1024 / 1024:.1f}MB（平均 {values['bytes'] / count / 1024:.0f}KB/枚）"
+        )
+    return " / ".join(lines) if lines else "なし"
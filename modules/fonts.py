@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+from PIL import ImageFont
+
+# 用途ごとのフォント候補（ファイル名, TTC内の番号）。検索パスの先頭のフォルダから順に探す
+FONT_ROLES = {
+    "regular": (("YUGOTHR.TTC", 0), ("YuGothic-Regular.ttf", 0), ("msgothic.ttc", 0)),
+    "bold": (("YUGOTHB.TTC", 1), ("YuGothic-Bold.ttf", 0), ("msgothic.ttc", 0)),
+    "header": (("YUGOTHB.TTC", 0), ("YuGothic-Bold.ttf", 0), ("msgothic.ttc", 0)),
+}
+
+def default_font_dirs():
+    """settings.json で font_dirs を指定しない場合のフォント検索パス"""
+    if sys.platform == "win32":
+        windir = os.environ.get("WINDIR", "C:/Windows")
+        return [os.path.join(windir, "Fonts"),
+                os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts")]
+    return ["/usr/share/fonts/truetype/yu", "/usr/share/fonts/truetype", "/usr/share/fonts",
+            os.path.expanduser("~/.fonts"), os.path.expanduser("~/.local/share/fonts")]
+
+class FontRegistry:
+    """プロセス内で共有するフォントの読み込みキャッシュ
+
+    フォントは (パス, TTC内の番号, サイズ) ごとに最初に使うときだけ読み込み、
+    以降はカード生成・ページ生成のどちらからも同じオブジェクトを返す。
+    """
+
+    def __init__(self, search_path=None):
+        self.search_path = list(search_path or default_font_dirs())
+        self._fonts = {}     # (path, index, size) -> font
+        self._resolved = {}  # role -> (path, index) / None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def resolve(self, role):
+        """用途に合うフォントファイルを検索パスから探す（見つからなければ None）"""
+        with self._lock:
+            if role not in self._resolved:
+                self._resolved[role] = self._find(FONT_ROLES[role])
+            return self._resolved[role]
+
+    def _find(self, candidates):
+        for name, index in candidates:
+            for font_dir in self.search_path:
+                path = os.path.join(font_dir, name)
+                if os.path.isfile(path):
+                    return path, index if path.lower().endswith(".ttc") else 0
+        return None
+
+    def get(self, path, index, size):
+        key = (path, index, size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is None:
+                font = ImageFont.truetype(path, size, index=index)
+                self._fonts[key] = font
+                self.loads += 1
+            return font
+
+    def font(self, role, size):
+        """用途とサイズに合うフォント（フォントが見つからなければ Pillow の既定フォント）"""
+        resolved = self.resolve(role)
+        if resolved is not None:
+            try:
+                return self.get(resolved[0], resolved[1], size)
+            except OSError as e:
+                print(f"フォントを読み込めませんでした: {resolved[0]} ({e})")
+        with self._lock:
+            key = (None, 0, size)
+            if key not in self._fonts:
+                print(f"フォントが見つからないため既定のフォントを使用します（{role}）")
+                self._fonts[key] = ImageFont.load_default()
+            return self._fonts[key]
+
+    def font_files(self, roles):
+        """使用中のフォントファイル（レンダーキャッシュのキー用）"""
+        return [resolved[0] for resolved in (self.resolve(role) for role in roles) if resolved is not None]
+
+# プロセス全体で共有するレジストリ（ワーカープロセスでは configure_fonts で1回だけ作る）
+_registry = None
+_registry_lock = threading.Lock()
+
+def configure_fonts(search_path=None):
+    """フォント検索パスを設定し、プロセス共通のレジストリを作り直す（None なら既定の検索パス）"""
+    global _registry
+    with _registry_lock:
+        _registry = FontRegistry(search_path)
+    return _registry
+
+def font_registry():
+    """プロセス共通のフォントレジストリ（未設定なら既定の検索パスで作る）"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = FontRegistry()
+        return _registry
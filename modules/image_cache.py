@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+def estimate_image_bytes(image):
+    """デコード後のビットマップサイズ（バイト）を見積もる"""
+    return image.width * image.height * len(image.getbands())
+
+class ImageCache:
+    """メモリ上限（バイト）付きのLRU画像キャッシュ
+
+    上限を超えた分は最も長く使われていない画像から閉じて破棄する。
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (image, nbytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, image, nbytes=None):
+        if nbytes is None:
+            nbytes = estimate_image_bytes(image)
+        if key in self._entries:
+            self._remove(key, close=False)
+        # 1枚で上限を超える画像はキャッシュしない（呼び出し側の参照のみ）
+        if nbytes > self.max_bytes:
+            return image
+
+        self._entries[key] = (image, nbytes)
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest, close=True)
+            self.evictions += 1
+        return image
+
+    def _remove(self, key, close):
+        image, nbytes = self._entries.pop(key)
+        self.current_bytes -= nbytes
+        if close:
+            try:
+                image.close()
+            except Exception:
+                pass
+
+    def clear(self):
+        for key in list(self._entries):
+            self._remove(key, close=True)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+def merge_stats(stats_list):
+    """複数プロセスのキャッシュ統計を合算する"""
+    merged = {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0, "max_bytes": 0}
+    for stats in stats_list:
+        for key in merged:
+            merged[key] += stats.get(key, 0)
+    return merged
+
+def format_stats(stats):
+    total = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / total * 100 if total else 0.0
+    return (f"ヒット {stats['hits']} / ミス {stats['misses']}（ヒット率 {hit_rate:.1f}%）, "
+            f"破棄 {stats['evictions']}, 保持 {stats['entries']}枚 "
+            f"{stats['bytes'] / 1024 / 1024:.1f}MB / {stats['max_bytes'] / 1024 / 1024:.0f}MB")
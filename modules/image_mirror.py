@@ -0,0 +1,148 @@
+import os
+import time
+import shutil
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_MIRROR_DIRNAME = ".image_mirror"
+
+def _same_file(src_stat, local_stat):
+    # コピー時に更新日時も写すので、サイズ+更新日時（ミリ秒）が同じなら変更なしとみなす
+    return (
+        src_stat.st_size == local_stat.st_size
+        and src_stat.st_mtime_ns // 1_000_000 == local_stat.st_mtime_ns // 1_000_000
+    )
+
+def _row_image_path(row):
+    return row[1] if len(row) > 1 else None
+
+class ImageMirror:
+    """共有ドライブ上の商品画像をローカルにコピーしておくキャッシュ
+
+    prefetch() が先の行の画像をスレッドで並行してコピーし、描画側は local_path() の
+    ローカルファイルだけを読む。サイズ+更新日時が元画像と同じコピーは次回以降も使い回す。
+    """
+
+    def __init__(self, cache_dir, workers=8, lookahead=None):
+        self.cache_dir = cache_dir
+        self.workers = max(1, workers)
+        self.lookahead = lookahead or self.workers * 4  # 先読みする行数
+        self._lock = threading.Lock()
+        self._stats = {"copied": 0, "fresh": 0, "missing": 0, "bytes": 0, "seconds": 0.0}
+        self._fetch_seconds = {}  # 元画像パス -> 確認・コピーにかかった秒数（計測ログ用）
+
+    def __getstate__(self):
+        # ワーカープロセスへはパスの変換に必要な設定だけを渡す
+        state = self.__dict__.copy()
+        state["_lock"] = None
+        state["_stats"] = {}
+        state["_fetch_seconds"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def local_path(self, image_path):
+        """元画像パスに対応するローカルコピーのパス（元パスのハッシュ + 拡張子）"""
+        key = hashlib.sha1(os.path.abspath(image_path).encode('utf-8')).hexdigest()
+        ext = os.path.splitext(image_path)[1].lower()
+        return os.path.join(self.cache_dir, key[:2], key + ext)
+
+    def fetch(self, image_path):
+        """元画像をローカルにコピーしてローカルパスを返す（元画像が無ければ None）"""
+        start = time.perf_counter()
+        try:
+            return self._fetch(image_path)
+        finally:
+            with self._lock:
+                self._fetch_seconds[image_path] = time.perf_counter() - start
+
+    def _fetch(self, image_path):
+        local_path = self.local_path(image_path)
+        try:
+            src_stat = os.stat(image_path)
+        except OSError:
+            # 元画像が消えていれば古いコピーも使わない
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            self._count("missing")
+            return None
+
+        try:
+            if _same_file(src_stat, os.stat(local_path)):
+                self._count("fresh")
+                return local_path
+        except OSError:
+            pass
+
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        # 途中で落ちても壊れたコピーが残らないよう一時ファイルから置き換える
+        tmp_path = f"{local_path}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copy2(image_path, tmp_path)
+            os.replace(tmp_path, local_path)
+        except OSError:
+            # 元画像が変わっているので、古いコピーを残すと前の画像で描画されてしまう（行はエラーにする）
+            for path in (tmp_path, local_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        self._count("copied", nbytes=src_stat.st_size, seconds=time.perf_counter() - start)
+        return local_path
+
+    def _fetch_quietly(self, image_path):
+        try:
+            return self.fetch(image_path)
+        except OSError as e:
+            print(f"画像のコピーに失敗しました: {image_path} ({e})")
+            return None
+
+    def prefetch(self, data_rows, image_path_of=None):
+        """行を順に返しながら、先の lookahead 行分の画像を並行してコピーする
+
+        画像パスは image_path_of(行)（省略時はB列）。各行は画像のコピーが終わってから返すので、
+        受け取った側は local_path() を読めばよい。
+        """
+        image_path_of = image_path_of or _row_image_path
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for row in data_rows:
+                image_path = image_path_of(row)
+                future = executor.submit(self._fetch_quietly, image_path) if image_path else None
+                pending.append((row, future))
+                if len(pending) >= self.lookahead:
+                    yield self._wait(pending.popleft())
+            while pending:
+                yield self._wait(pending.popleft())
+        print(f"画像ミラー: {format_mirror_stats(self.stats())}")
+
+    def _wait(self, item):
+        row, future = item
+        if future is not None:
+            future.result()
+        return row
+
+    def _count(self, name, nbytes=0, seconds=0.0):
+        with self._lock:
+            self._stats[name] += 1
+            self._stats["bytes"] += nbytes
+            self._stats["seconds"] += seconds
+
+    def pop_fetch_seconds(self, image_path):
+        """prefetch() で画像の確認・コピーにかかった秒数（未取得なら None）"""
+        with self._lock:
+            return self._fetch_seconds.pop(image_path, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+def format_mirror_stats(stats):
+    return (
+        f"コピー {stats['copied']}枚 {stats['bytes'] / 1024 / 1024:.1f}MB（{stats['seconds']:.1f}秒）"
+        f" / 変更なし {stats['fresh']} / 元画像なし {stats['missing']}"
+    )
@@ -0,0 +1,248 @@
+import os
+import re
+import copy
+from .card_layouts import CardLayoutManager, select_layout
+from .page_generator import A4PageGenerator, safe_page_name, card_image_path, open_card_image
+from .page_manifest import PageManifest
+from .encoder import OutputEncoder, merge_encode_stats, subtract_encode_stats, format_encode_stats
+from .timing import RowTimer, timed
+from .fonts import font_registry, configure_fonts
+from .pipeline import bounded_map, process_pool, peak_rss_bytes
+
+def split_page(page_name, cards, layout_manager=None):
+    """1ページに収まらないカードを複数ページに分ける（[(ページ名, カード), ...]）
+
+    分けたページには「商品名（1/2）」のように通し番号を付ける。
+    """
+    layout_manager = layout_manager or CardLayoutManager()
+    counts = layout_manager.paginate(len(cards))
+    if len(counts) == 1:
+        return [(page_name, cards)]
+    pages = []
+    start = 0
+    for i, count in enumerate(counts, 1):
+        pages.append((f"{page_name}（{i}/{len(counts)}）", cards[start:start + count]))
+        start += count
+    return pages
+
+# split_page が分けたページの名前に付ける通し番号（「商品名（1/2）」の「（1/2）」）
+SPLIT_PAGE_SUFFIX = re.compile(r"（\d+/\d+）$")
+
+def base_page_name(page_name):
+    """split_page で付けた通し番号を除いたページ商品名"""
+    return SPLIT_PAGE_SUFFIX.sub("", page_name)
+
+def group_pages(data_rows):
+    """CSVの出現順を保ったままページ商品名ごとにカードをまとめる（収まらない分は次のページへ）"""
+    product_groups = {}
+    for row in data_rows:
+        if len(row) >= 6:  # 必要な列数をチェック
+            page_product_name = row[5]  # F列：ページ商品名
+            product_groups.setdefault(page_product_name, []).append({
+                'item_code': row[0],
+                'product_name': row[2],
+                'color': row[3],
+            })
+    layout_manager = CardLayoutManager()
+    pages = []
+    for page_name, cards in product_groups.items():
+        pages.extend(split_page(page_name, cards, layout_manager))
+    return pages
+
+def plan_page(page_name, cards, card_dir, pattern_rule="first", card_ext=".png"):
+    """ページのパターンを選び、(パターンID, CardLayout, 配置順のカード画像パス) を返す"""
+    layout_manager = CardLayoutManager()
+    pattern_id, layout = select_layout(layout_manager.get_layouts_for_count(len(cards)), pattern_rule)
+    if layout is None:
+        return None, None, []
+    card_paths = [
+        card_image_path(card_dir, card['item_code'], card['product_name'], card['color'], size, card_ext)
+        for card, size in zip(cards, layout.sizes)
+    ]
+    return pattern_id, layout, card_paths
+
+def compose_page(page_name, cards, card_dir, page_output_dir, pattern_rule="first", card_images=None, encoder=None,
+                 timer=None):
+    """1ページ分のカードを配置してA4ページを保存し、ログ用の辞書を返す
+
+    card_images（{カード画像パス: 画像}）にあるカードはファイルを読まずにそのまま使う。
+    カード・ページの保存形式は encoder（OutputEncoder）に従う。
+    timer（RowTimer）を渡すとカード読み込み・配置・エンコード・保存の時間を記録する。
+    """
+    page_generator = A4PageGenerator()
+    encoder = encoder or OutputEncoder()
+
+    pattern_id, layout, card_paths = plan_page(page_name, cards, card_dir, pattern_rule, encoder.extension)
+    if layout is None:
+        print(f"配置パターンがないため、ページ {page_name} は生成されませんでした。")
+        return {
+            "page_name": page_name,
+            "status": "異常",
+            "log": f"{len(cards)}枚に対応する配置パターンがありません",
+            "card_count": "0"
+        }
+
+    # カード情報を準備
+    page_cards = []
+    missing_images = []
+    for card, pos, size, image_path in zip(cards, layout.positions, layout.sizes, card_paths):
+        try:
+            with timed(timer, "load_cards"):
+                card_image = open_card_image(image_path, card_images)
+        except Exception as e:
+            print(f"最終画像読み込みエラー: {image_path}, エラー: {str(e)}")
+            missing_images.append(f"{card['product_name']}-{card['color']}")
+            continue
+        if card_image is None:
+            print(f"最終画像が見つかりません: {image_path}")
+            missing_images.append(f"{card['product_name']}-{card['color']}")
+            continue
+        page_cards.append({
+            'image': card_image,
+            'x': pos[0],
+            'y': pos[1],
+            'item_code': card['item_code'],
+            'size': size
+        })
+
+    status = "正常"
+    log_message = ""
+    if missing_images:
+        status = "異常"
+        log_message = f"足りない画像があります: {', '.join(missing_images[:3])}"
+        if len(missing_images) > 3:
+            log_message += f" 他{len(missing_images) - 3}件"
+
+    if page_cards:
+        with timed(timer, "compose"):
+            page_image = page_generator.create_a4_page(page_cards, page_name)
+        output_path = os.path.join(page_output_dir, f"{safe_page_name(page_name)}{encoder.extension}")
+        encoder.save(page_image, output_path, timer=timer)
+        print(f"ページを保存しました（{pattern_id}）: {output_path}")
+    else:
+        print(f"カードがないため、ページ {page_name} は生成されませんでした。")
+
+    return {
+        "page_name": page_name,
+        "status": status,
+        "log": log_message,
+        "card_count": str(len(page_cards))
+    }
+
+def _compose_page_task(task):
+    # このページのエンコード統計（encoder の累計の差分）とワーカーのピークメモリも一緒に返す
+    page_name, args, timing = task
+    timer = RowTimer() if timing else None
+    encoder = args[-1]
+    before = encoder.stats()
+    entry = compose_page(*args, timer=timer)
+    if timer is not None:
+        entry["timings"] = timer.as_dict()
+    return page_name, entry, subtract_encode_stats(encoder.stats(), before), os.getpid(), peak_rss_bytes()
+
+class HeadlessPageCreator:
+    """GUIを使わずにCSVの並び順のままページを生成する"""
+
+    def __init__(self, pattern_rule="first", workers=None, page_manifest=True, hash_content=False, card_store=None,
+                 encoder=None, timing=False, max_in_flight=None, journal=None, manifest_tag=None):
+        self.pattern_rule = pattern_rule
+        self.workers = workers or os.cpu_count() or 1
+        self.page_manifest = page_manifest
+        self.hash_content = hash_content
+        # ページマニフェストのファイル名に付ける名前（シャードごとに分ける）
+        self.manifest_tag = manifest_tag
+        # カード生成から渡されたメモリ上のカード（無ければファイルから読む）
+        self.card_store = card_store
+        # カード・ページの保存形式（統計がカード生成と混ざらないよう、設定だけを写したページ用のもの）
+        self.encoder = copy.copy(encoder) if encoder is not None else OutputEncoder()
+        # ページごとの処理時間をログの辞書（"timings"）に含める
+        self.timing = timing
+        # ワーカーに投入済みで結果を回収していないページ数の上限（カード画像を抱えたタスクを溜めない）
+        self.max_in_flight = max(self.workers, max_in_flight or self.workers * 2)
+        # ワーカープロセスごとのピークメモリ（{pid: バイト数}）
+        self.worker_peak_rss = {}
+        # 完了したページを記録する実行ジャーナル（RunJournal、前回完了済みのページは作り直さない）
+        self.journal = journal
+
+    def process_csv_data(self, data_rows, card_dir, a4_output_dir, page_stream=None):
+        """ページを生成し、CSVのページ順のログの辞書のリストを返す
+
+        page_stream（PageStream）を渡すと、カード生成と並行してカードが揃ったページから順に生成する
+        （data_rows はカード生成側で読みながら増えていくので、ページの順番は最後に data_rows から決める）。
+        """
+        os.makedirs(a4_output_dir, exist_ok=True)
+        manifest = (PageManifest(a4_output_dir, hash_content=self.hash_content, tag=self.manifest_tag)
+                    if self.page_manifest else None)
+        page_generator = A4PageGenerator()
+
+        results = {}  # ページ名 -> ログの辞書（生成の順番には依らない）
+        pending = []  # (ページ名, マニフェストのエントリ)
+        planned = {}  # ページ名 -> (ページ画像パス, カード画像パス)（ジャーナル記録用）
+
+        def finish(page_name, entry, output_path, card_paths):
+            results[page_name] = entry
+            if self.journal is not None:
+                self.journal.record_page(entry, output_path, card_paths)
+
+        # カード生成と並行する場合は、カードが揃ったページから届く（最後は None）
+        pages = iter(page_stream.queue.get, None) if page_stream is not None else group_pages(data_rows)
+
+        def page_tasks():
+            # ページを1つずつ計画し、作り直すページだけをタスクとして流す（カード画像は投入直前に取り出す）
+            for page_name, cards in pages:
+                pattern_id, layout, card_paths = plan_page(page_name, cards, card_dir, self.pattern_rule,
+                                                           self.encoder.extension)
+                output_path = os.path.join(a4_output_dir, f"{safe_page_name(page_name)}{self.encoder.extension}")
+                if self.journal is not None and layout is not None:
+                    finished = self.journal.finished_page(page_name, output_path, card_paths)
+                    if finished is not None:
+                        results[page_name] = finished
+                        continue
+                # 今回生成したカード（メモリにある）を含むページは常に作り直す
+                in_memory = [path for path in card_paths if self.card_store is not None and path in self.card_store]
+                if manifest is not None and layout is not None:
+                    entry = manifest.page_entry(page_name, pattern_id, card_paths, page_generator)
+                    if manifest.is_fresh(page_name, entry, output_path, changed=bool(in_memory)):
+                        finish(page_name, {
+                            "page_name": page_name,
+                            "status": "正常",
+                            "log": "変更がないため再生成をスキップしました",
+                            "card_count": str(len(card_paths))
+                        }, output_path, card_paths)
+                        continue
+                    pending.append((page_name, entry))
+                card_images = {path: self.card_store.get(path) for path in in_memory} or None
+                planned[page_name] = (output_path, card_paths)
+                yield (page_name, (page_name, cards, card_dir, a4_output_dir, self.pattern_rule,
+                                  card_images, self.encoder), self.timing)
+
+        encode_stats = []
+
+        def collect(composed):
+            for page_name, entry, stats, pid, peak_rss in composed:
+                finish(page_name, entry, *planned.pop(page_name))
+                encode_stats.append(stats)
+                if self.workers > 1:
+                    self.worker_peak_rss[pid] = peak_rss
+
+        if self.workers <= 1:
+            collect(map(_compose_page_task, page_tasks()))
+        else:
+            # ページ単位でプロセスに分散（結果はCSVの順番のまま、投入は max_in_flight ページまで）
+            # ワーカーごとに親プロセスと同じ検索パスでフォントレジストリを1回だけ作る
+            with process_pool(self.workers, initializer=configure_fonts,
+                              initargs=(font_registry().search_path,)) as executor:
+                collect(bounded_map(executor, _compose_page_task, page_tasks(), self.max_in_flight))
+        if page_stream is not None:
+            # カード生成が途中で止まった場合は、届かなかったページを探す前にその例外を出す
+            page_stream.check()
+        if encode_stats:
+            print(f"ページのエンコード: {format_encode_stats(merge_encode_stats(encode_stats))}")
+
+        if manifest is not None:
+            for page_name, entry in pending:
+                if results[page_name]["status"] == "正常":
+                    manifest.update(page_name, entry)
+            manifest.save()
+            print(f"ページマニフェスト: スキップ {manifest.hits} / 再生成 {manifest.misses}")
+        return [results[page_name] for page_name, _ in group_pages(data_rows)]
@@ -1,213 +1,24 @@
 import os
 import csv
+import queue
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageDraw, ImageFont, ImageTk
-import sys
+from tkinter import ttk, filedialog
+from PIL import ImageTk
 import datetime
-from collections import defaultdict
-import chardet
 from .card_layouts import CardLayoutManager
-
-class A4PageGenerator:
-    def __init__(self):
-        # A4サイズ（300dpi、横）
-        self.a4_width = 3508
-        self.a4_height = 2480
-        
-        # ヘッダーサイズ
-        self.header_width = 3408
-        self.header_height = 270
-        
-        # ヘッダーの位置（中央寄せ）
-        self.header_x = int((self.a4_width - self.header_width) / 2)  # 50px
-        self.header_y = 60
-        self.header_border_width = 10
-        
-        # フォントサイズ（20pt = 86px @ 300dpi）
-        self.header_font_size = 86
-
-    def create_a4_page(self, cards, page_product_name):
-        page = Image.new('RGB', (self.a4_width, self.a4_height), 'white')
-        draw = ImageDraw.Draw(page)
-
-        # ヘッダー
-        draw.rectangle(
-            (self.header_x, self.header_y, 
-             self.header_x + self.header_width, self.header_y + self.header_height),
-            outline='black', width=self.header_border_width
-        )
-
-        # フォント
-        try:
-            font_path = "C:/Windows/Fonts/YUGOTHB.TTC" if sys.platform == "win32" else "/usr/share/fonts/truetype/yu/YuGothic-Bold.ttf"
-            font = ImageFont.truetype(font_path, self.header_font_size, index=0)
-        except:
-            try:
-                font = ImageFont.truetype("msgothic.ttc", self.header_font_size)
-            except:
-                font = ImageFont.load_default()
-
-        # ヘッダーテキスト
-        # 他バリエーションはこちら（左揃え）
-        draw.text((self.header_x + 50, self.header_y + self.header_height/2), 
-                  "他バリエーションはこちら", font=font, fill='black', anchor="lm")
-        
-        # 商品名（右揃え）
-        draw.text((self.header_x + self.header_width - 50, self.header_y + self.header_height/2), 
-                  f"商品名：{page_product_name}", font=font, fill='black', anchor="rm")
-
-        # カード配置
-        for card_info in cards:
-            card_img = card_info['image']
-            x = card_info['x']
-            y = card_info['y']
-            page.paste(card_img, (x, y))
-
-        return page
-
-    def calculate_positions_and_sizes(self, num_cards):
-        positions = []
-        sizes = []  # 'full' または 'half'
-        
-        # カードサイズ定義（300dpi）
-        full_width = 1704  # フルサイズの幅
-        full_height = 2000  # フルサイズの高さ
-        half_width = 852   # ハーフサイズの幅
-        half_height = 1000 # ハーフサイズの高さ
-        
-        # 余白
-        margin_top = 400
-        
-        if num_cards == 1:
-            positions = [(int((self.a4_width - full_width) / 2), margin_top)]  # 中央
-            sizes = ['full']
-        elif num_cards == 2:
-            # 2枚の場合はフルサイズ2枚を横に並べて中央揃え
-            total_width = full_width * 2
-            center_offset = int((self.a4_width - total_width) / 2)
-            positions = [
-                (center_offset, margin_top),
-                (center_offset + full_width, margin_top)
-            ]
-            sizes = ['full', 'full']
-        elif num_cards == 3:
-            # 全体の幅を計算（フル幅 + ハーフ幅）
-            total_width = full_width + half_width
-            # 中央寄せのためのオフセットを計算
-            center_offset = int((self.a4_width - total_width) / 2)
-            
-            # フル画像とハーフ画像の位置を計算
-            x1 = center_offset  # フル画像の開始位置
-            x2 = x1 + full_width  # ハーフ画像の開始位置（フル画像の直後）
-            
-            positions = [
-                (x1, margin_top),  # 左（フル）
-                (x2, margin_top),  # 右上（ハーフ）
-                (x2, margin_top + half_height)  # 右下（ハーフ）、上のハーフ画像にくっつける
-            ]
-            sizes = ['full', 'half', 'half']
-        elif num_cards == 4:
-            # フル画像1枚 + 残りをハーフサイズで配置
-            num_half = num_cards - 1
-            num_half_cols = 2  # ハーフサイズ画像の列数
-            num_half_rows = (num_half + num_half_cols - 1) // num_half_cols  # 切り上げ除算
-
-            # 全体の幅を計算（フル幅 + ハーフ幅 * 列数）
-            total_width = full_width + half_width * num_half_cols
-            # 中央寄せのためのオフセットを計算
-            center_offset = int((self.a4_width - total_width) / 2)
-
-            # フル画像の位置（左側）
-            positions.append((center_offset, margin_top))
-            sizes.append('full')
-
-            # ハーフ画像の位置（右側に格子状に配置）
-            half_start_x = center_offset + full_width
-            for i in range(num_half):
-                col = i % num_half_cols
-                row = i // num_half_cols
-                x = half_start_x + col * half_width
-                y = margin_top + row * half_height
-                positions.append((x, y))
-                sizes.append('half')
-        elif num_cards == 5:
-            # フル画像1枚 + 残りをハーフサイズで配置
-            num_half = num_cards - 1
-            num_half_cols = 2  # ハーフサイズ画像の列数
-            num_half_rows = (num_half + num_half_cols - 1) // num_half_cols  # 切り上げ除算
-
-            # 全体の幅を計算（フル幅 + ハーフ幅 * 列数）
-            total_width = full_width + half_width * num_half_cols
-            # 中央寄せのためのオフセットを計算
-            center_offset = int((self.a4_width - total_width) / 2)
-
-            # フル画像の位置（左側）
-            positions.append((center_offset, margin_top))
-            sizes.append('full')
-
-            # ハーフ画像の位置（右側に格子状に配置）
-            half_start_x = center_offset + full_width
-            for i in range(num_half):
-                col = i % num_half_cols
-                row = i // num_half_cols
-                x = half_start_x + col * half_width
-                y = margin_top + row * half_height
-                positions.append((x, y))
-                sizes.append('half')
-        elif num_cards == 6:
-            # ハーフサイズを3x2で配置
-            num_cols = 3
-            num_rows = 2
-            total_width = half_width * num_cols
-            center_offset_x = int((self.a4_width - total_width) / 2)
-
-            for i in range(num_cards):
-                col = i % num_cols
-                row = i // num_cols
-                x = center_offset_x + col * half_width
-                y = margin_top + row * half_height
-                positions.append((x, y))
-                sizes.append('half')
-        elif num_cards == 7:
-            # ハーフサイズを4+3で配置
-            total_width = half_width * 4
-            center_offset_x = int((self.a4_width - total_width) / 2)
-
-            # 上段4枚
-            for i in range(4):
-                x = center_offset_x + i * half_width
-                y = margin_top
-                positions.append((x, y))
-                sizes.append('half')
-
-            # 下段3枚
-            total_width = half_width * 3
-            center_offset_x = int((self.a4_width - total_width) / 2)
-            for i in range(3):
-                x = center_offset_x + i * half_width
-                y = margin_top + half_height
-                positions.append((x, y))
-                sizes.append('half')
-        elif num_cards == 8:
-            # ハーフサイズを4x2で配置
-            num_cols = 4
-            num_rows = 2
-            total_width = half_width * num_cols
-            center_offset_x = int((self.a4_width - total_width) / 2)
-
-            for i in range(num_cards):
-                col = i % num_cols
-                row = i // num_cols
-                x = center_offset_x + col * half_width
-                y = margin_top + row * half_height
-                positions.append((x, y))
-                sizes.append('half')
-
-        return positions, sizes
+from .page_generator import A4PageGenerator, safe_page_name, card_image_path, open_card_image
+from .page_batch import group_pages, split_page
+from .page_manifest import PageManifest
+from .preview_cache import PreviewCache
+from .encoder import OutputEncoder
+from .csv_source import read_csv
+from .timing import RowTimer, timed
+from .fonts import configure_fonts
+from .settings import load_settings
 
 class CardPlacementInterface:
-    def __init__(self, page_data=None, card_dir="output", page_output_dir="a4_output"):
+    def __init__(self, page_data=None, card_dir="output", page_output_dir="a4_output", page_manifest=True,
+                 card_store=None, encoder=None, timing=False, journal=None, page_stream=None, hash_content=False):
         self.root = tk.Tk()
         self.root.title("カード配置")
         self.root.geometry("1200x800")
@@ -230,8 +41,30 @@ class CardPlacementInterface:
         self.card_dir = card_dir
         self.page_output_dir = page_output_dir
 
+        # カード生成から渡されたメモリ上のカード（無ければファイルから読む）
+        self.card_store = card_store
+
+        # カード・ページの保存形式
+        self.encoder = encoder or OutputEncoder()
+
+        # ページごとの処理時間をログの辞書（"timings"）に含める
+        self.timing = timing
+
+        # プレビュー用の縮小済みカード画像
+        self.preview_cache = PreviewCache(card_store=card_store)
+
+        # ページマニフェスト（変更のないページは再生成しない、hash_content なら内容のハッシュで判定）
+        self.page_manifest = PageManifest(page_output_dir, hash_content=hash_content) if page_manifest else None
+
+        # 完了したページを記録する実行ジャーナル（RunJournal、前回完了済みのページは表示しない）
+        self.journal = journal
+
         # 外部から渡されたページデータ
         self.page_data = page_data
+
+        # カード生成と並行する場合に、カードが揃ったページが届くキュー（PageStream）
+        self.page_stream = page_stream
+        self.stream_done = page_stream is None
         self.all_cards = []
         self.page_product_names = []
         
@@ -449,21 +282,19 @@ class CardPlacementInterface:
         for i, (pos, size) in enumerate(zip(self.card_positions, self.card_sizes)):
             if i < len(self.card_data):
                 card = self.card_data[i]
-                image_path = os.path.join(
-                    self.card_dir,
-                    f"{card['item_code']}-{card['product_name']}_{card['color_jp']}_{'full' if size == 'full' else 'half'}.png"
+                image_path = card_image_path(
+                    self.card_dir, card['item_code'], card['product_name'], card['color_jp'], size,
+                    self.encoder.extension
                 )
                 
                 print(f"プレビュー用画像パス: {image_path}")  # デバッグ用
                 
-                if os.path.exists(image_path):
-                    try:
-                        image = Image.open(image_path)
-                        # 表示用に縮小
-                        image = image.resize(
-                            (int(image.width * self.scale), int(image.height * self.scale)),
-                            Image.Resampling.LANCZOS
-                        )
+                try:
+                    # 表示用に縮小済みの画像（カード生成時のサムネイルから作る）
+                    card_size = ((self.layout_manager.full_width, self.layout_manager.full_height) if size == 'full'
+                                 else (self.layout_manager.half_width, self.layout_manager.half_height))
+                    image = self.preview_cache.get(image_path, self.scale, card_size)
+                    if image is not None:
                         photo = ImageTk.PhotoImage(image)
                         # スケールした位置に描画
                         self.canvas.create_image(
@@ -473,12 +304,12 @@ class CardPlacementInterface:
                             anchor=tk.NW
                         )
                         self.preview_images.append(photo)  # 参照をリストで保持
-                    except Exception as e:
-                        print(f"画像読み込みエラー: {image_path}, エラー: {str(e)}")
+                    else:
+                        print(f"画像が見つかりません: {image_path}")
                         missing_images.append(f"{card['product_name']} - {card['color_jp']}")
                         self.draw_missing_image_placeholder(pos, size)
-                else:
-                    print(f"画像が見つかりません: {image_path}")
+                except Exception as e:
+                    print(f"画像読み込みエラー: {image_path}, エラー: {str(e)}")
                     missing_images.append(f"{card['product_name']} - {card['color_jp']}")
                     self.draw_missing_image_placeholder(pos, size)
         
@@ -545,24 +376,53 @@ class CardPlacementInterface:
         output_dir = self.page_output_dir
         os.makedirs(output_dir, exist_ok=True)
         
+        # 前回と同じ構成・同じカード画像ならページを作り直さない
+        output_path = os.path.join(output_dir, f"{safe_page_name(self.current_page)}{self.encoder.extension}")
+        manifest_entry = None
+        if self.page_manifest is not None and self.card_data:
+            card_paths = [
+                card_image_path(self.card_dir, card['item_code'], card['product_name'], card['color_jp'], size,
+                                self.encoder.extension)
+                for card, size in zip(self.card_data, self.card_sizes)
+            ]
+            manifest_entry = self.page_manifest.page_entry(
+                self.current_page, self.pattern_var.get(), card_paths, self.page_generator
+            )
+            # 今回生成したカード（メモリにある）を含むページは常に作り直す
+            in_memory = self.card_store is not None and any(path in self.card_store for path in card_paths)
+            if self.page_manifest.is_fresh(self.current_page, manifest_entry, output_path, changed=in_memory):
+                self.add_log_entry({
+                    "page_name": self.current_page,
+                    "status": "正常",
+                    "log": "変更がないため再生成をスキップしました",
+                    "card_count": str(len(card_paths))
+                }, output_path, card_paths)
+                print(f"変更がないため、ページ {self.current_page} の再生成をスキップしました。")
+                self.go_to_next_page()
+                return
+
         # カード情報を準備
         cards = []
+        page_card_paths = []
         missing_images = []
+        timer = RowTimer() if self.timing else None
         
         for i, (pos, size) in enumerate(zip(self.card_positions, self.card_sizes)):
             if i < len(self.card_data):
                 card = self.card_data[i]
-                image_path = os.path.join(
-                    self.card_dir,
-                    f"{card['item_code']}-{card['product_name']}_{card['color_jp']}_{'full' if size == 'full' else 'half'}.png"
+                image_path = card_image_path(
+                    self.card_dir, card['item_code'], card['product_name'], card['color_jp'], size,
+                    self.encoder.extension
                 )
+                page_card_paths.append(image_path)
                 
                 # 画像パスを出力（デバッグ用）
                 print(f"最終画像用パス: {image_path}")
                 
-                if os.path.exists(image_path):
-                    try:
-                        card_image = Image.open(image_path)
+                try:
+                    with timed(timer, "load_cards"):
+                        card_image = open_card_image(image_path, self.card_store)
+                    if card_image is not None:
                         cards.append({
                             'image': card_image,
                             'x': pos[0],
@@ -570,11 +430,11 @@ class CardPlacementInterface:
                             'item_code': card['item_code'],
                             'size': size
                         })
-                    except Exception as e:
-                        print(f"最終画像読み込みエラー: {image_path}, エラー: {str(e)}")
+                    else:
+                        print(f"最終画像が見つかりません: {image_path}")
                         missing_images.append(f"{card['product_name']}-{card['color_jp']}")
-                else:
-                    print(f"最終画像が見つかりません: {image_path}")
+                except Exception as e:
+                    print(f"最終画像読み込みエラー: {image_path}, エラー: {str(e)}")
                     missing_images.append(f"{card['product_name']}-{card['color_jp']}")
         
         # ページを生成
@@ -588,23 +448,30 @@ class CardPlacementInterface:
                 log_message += f" 他{len(missing_images) - 3}件"
         
         # ログデータを追加
-        self.log_data.append({
+        log_entry = {
             "page_name": self.current_page,
             "status": status,
             "log": log_message,
             "card_count": str(len(cards))  # 単純に枚数のみを表示
-        })
+        }
         
         if cards:
-            page_image = self.page_generator.create_a4_page(cards, self.current_page)
+            with timed(timer, "compose"):
+                page_image = self.page_generator.create_a4_page(cards, self.current_page)
             
             # ページを保存（ファイル名に使えない文字を置換）
-            safe_page_name = self.current_page.replace('/', '／').replace('\\', '＼').replace(':', '：').replace('*', '＊').replace('?', '？').replace('"', "'").replace('<', '＜').replace('>', '＞').replace('|', '｜')
-            output_path = os.path.join(output_dir, f"{safe_page_name}.png")
-            page_image.save(output_path)
-            print(f"ページを保存しました: {output_path}")
+            elapsed, nbytes = self.encoder.save(page_image, output_path, timer=timer)
+            print(f"ページを保存しました: {output_path}（{elapsed:.2f}秒, {nbytes / 1024:.0f}KB）")
+
+            if manifest_entry is not None and status == "正常":
+                self.page_manifest.update(self.current_page, manifest_entry)
+                self.page_manifest.save()
         else:
             print(f"カードがないため、ページ {self.current_page} は生成されませんでした。")
+        if timer is not None:
+            log_entry["timings"] = timer.as_dict()
+        # ページの保存が終わってから記録する（途中で止まったページは再開時に作り直す）
+        self.add_log_entry(log_entry, output_path, page_card_paths)
         
         # 次のページへ
         self.go_to_next_page()
@@ -614,30 +481,79 @@ class CardPlacementInterface:
             return
             
         # ログデータを追加
-        self.log_data.append({
+        output_path = os.path.join(self.page_output_dir, f"{safe_page_name(self.current_page)}{self.encoder.extension}")
+        self.add_log_entry({
             "page_name": self.current_page,
             "status": "スキップ",
             "log": "ユーザーによりスキップされました",
             "card_count": "0"  # スキップ時は0を表示
-        })
+        }, output_path)
         
         print(f"ページ {self.current_page} をスキップしました。")
         
         # 次のページへ
         self.go_to_next_page()
     
+    def add_log_entry(self, log_entry, output_path, card_paths=()):
+        # ログに追加し、ジャーナルにも1ページずつ記録する
+        self.log_data.append(log_entry)
+        if self.journal is not None:
+            self.journal.record_page(log_entry, output_path, card_paths)
+
     def go_to_next_page(self):
         # 次のページへ
         self.current_page_index += 1
+        self.show_current_page()
+
+    def show_current_page(self):
         if self.current_page_index < len(self.page_product_names):
             self.current_page = self.page_product_names[self.current_page_index]
             self.load_page(self.current_page)
+        elif not self.stream_done:
+            # 次のページのカードがまだ生成中（届いたら poll_page_stream が表示する）
+            self.show_waiting()
         else:
             # すべてのページが完了したらログを保存
             self.save_log()
             self.root.destroy()
+
+    def show_waiting(self):
+        self.current_page = None
+        self.card_data = []
+        self.card_listbox.delete(0, tk.END)
+        self.reflect_changes()
+        self.canvas.create_text(
+            int(self.page_generator.a4_width * self.scale / 2),
+            int(self.page_generator.a4_height * self.scale / 2),
+            text="カードを生成中です。\nカードが揃ったページから表示します。",
+            justify=tk.CENTER
+        )
+
+    def poll_page_stream(self):
+        # カード生成のスレッドから届いたページを取り込む（Tkは別スレッドから触れないのでタイマーで見に行く）
+        while True:
+            try:
+                page = self.page_stream.queue.get_nowait()
+            except queue.Empty:
+                break
+            if page is None:
+                self.stream_done = True
+                break
+            self.add_page(*page)
+        # 待ち画面のときだけ、届いたページ（または終わり）を表示する
+        if self.current_page is None and (self.current_page_index < len(self.page_product_names) or self.stream_done):
+            self.show_current_page()
+        if not self.stream_done:
+            self.root.after(200, self.poll_page_stream)
     
+    def sort_log(self):
+        # カード生成と並行した場合、ページはカードが揃った順に届くので、CSVのページ順に並べ直す
+        if self.page_stream is not None:
+            self.log_data.sort(key=lambda log_entry: self.page_stream.page_order(log_entry["page_name"]))
+
     def save_log(self):
+        self.sort_log()
+
         # logフォルダが存在しない場合は作成
         log_dir = "log"
         os.makedirs(log_dir, exist_ok=True)
@@ -664,6 +580,14 @@ class CardPlacementInterface:
         print(f"ログを保存しました: {log_path}")
     
     def main(self):
+        if self.page_stream is not None:
+            # カード生成と並行する場合は、カードが揃ったページから順に表示する
+            self.current_page_index = 0
+            self.show_waiting()
+            self.poll_page_stream()
+            self.root.mainloop()
+            return
+
         # 外部からデータが渡された場合はそれを使用
         if self.page_data:
             self.process_page_data()
@@ -689,81 +613,99 @@ class CardPlacementInterface:
     def process_page_data(self):
         # create_all.pyから渡されたデータを処理
         for page_name, cards in self.page_data:
-            self.page_product_names.append(page_name)
-            for card in cards:
-                self.all_cards.append({
-                    'item_code': card['item_code'],
-                    'product_name': card['product_name'],
-                    'color_jp': card['color'],
-                    'page_product_name': page_name
-                })
-                # プレビュー用画像パスを出力（デバッグ用）
-                if len(self.all_cards) <= 3:  # 最初の3枚だけ表示
-                    size = 'full' if len(self.all_cards) == 1 else 'half'
-                    print(f"プレビュー用画像パス: {self.card_dir}\\{card['item_code']}-{card['product_name']}_{card['color']}_{size}.png")
+            self.add_page(page_name, cards)
+
+    def add_page(self, page_name, cards):
+        if self.journal is not None:
+            # 前回の実行で保存まで終わったページは配置画面に出さない
+            output_path = os.path.join(self.page_output_dir, f"{safe_page_name(page_name)}{self.encoder.extension}")
+            finished = self.journal.finished_page(page_name, output_path)
+            if finished is not None:
+                self.log_data.append(finished)
+                return
+        self.page_product_names.append(page_name)
+        for card in cards:
+            self.all_cards.append({
+                'item_code': card['item_code'],
+                'product_name': card['product_name'],
+                'color_jp': card['color'],
+                'page_product_name': page_name
+            })
+            # プレビュー用画像パスを出力（デバッグ用）
+            if len(self.all_cards) <= 3:  # 最初の3枚だけ表示
+                size = 'full' if len(self.all_cards) == 1 else 'half'
+                print(f"プレビュー用画像パス: {self.card_dir}\\{card['item_code']}-{card['product_name']}_{card['color']}_{size}{self.encoder.extension}")
     
     def load_csv(self, csv_path):
         # CSVからデータを読み込む
         self.all_cards = []
         self.page_product_names = set()
         
-        with open(csv_path, 'r', encoding='shift_jis') as f:
-            reader = csv.reader(f)
-            next(reader)  # ヘッダーをスキップ
+        _, rows = read_csv(csv_path)  # ヘッダーは使わない
+        for row in rows:
+            if len(row) < 6:  # F列まで必要
+                print(f"スキップ: 列数が足りません")
+                continue
             
-            for row in reader:
-                if len(row) < 6:  # F列まで必要
-                    print(f"スキップ: 列数が足りません")
-                    continue
-                
-                item_code = row[0]      # A列：商品コード
-                product_name = row[2]    # C列：商品名
-                color_jp = row[3]        # D列：カラー名（日本語）
-                page_product_name = row[5]  # F列：ページ商品名
-                
-                self.all_cards.append({
-                    'item_code': item_code,
-                    'product_name': product_name,
-                    'color_jp': color_jp,
-                    'page_product_name': page_product_name
-                })
-                self.page_product_names.add(page_product_name)
+            item_code = row[0]      # A列：商品コード
+            product_name = row[2]    # C列：商品名
+            color_jp = row[3]        # D列：カラー名（日本語）
+            page_product_name = row[5]  # F列：ページ商品名
+            
+            self.all_cards.append({
+                'item_code': item_code,
+                'product_name': product_name,
+                'color_jp': color_jp,
+                'page_product_name': page_product_name
+            })
+            self.page_product_names.add(page_product_name)
         
         # ページ商品名をソート
         self.page_product_names = sorted(list(self.page_product_names))
 
+        # 1ページに収まらない商品は複数ページに分ける
+        page_names = []
+        for page_name in self.page_product_names:
+            cards = [card for card in self.all_cards if card['page_product_name'] == page_name]
+            for split_name, split_cards in split_page(page_name, cards, self.layout_manager):
+                for card in split_cards:
+                    card['page_product_name'] = split_name
+                page_names.append(split_name)
+        self.page_product_names = page_names
+
 class PageCreator:
-    def __init__(self):
+    def __init__(self, page_manifest=True, card_store=None, encoder=None, timing=False, journal=None,
+                 hash_content=False):
         self.page_generator = A4PageGenerator()
-
-    def process_csv_data(self, data_rows, card_dir, a4_output_dir):
+        self.page_manifest = page_manifest
+        self.hash_content = hash_content
+        self.card_store = card_store
+        self.encoder = encoder
+        self.timing = timing
+        self.journal = journal
+
+    def process_csv_data(self, data_rows, card_dir, a4_output_dir, page_stream=None):
         # データをCardPlacementInterfaceに渡すための形式に変換
-        page_data = []
-        product_groups = {}
-        
-        # 商品グループごとにデータを整理
-        for row in data_rows:
-            if len(row) >= 6:  # 必要な列数をチェック
-                page_product_name = row[5]  # F列：ページ商品名
-                if page_product_name not in product_groups:
-                    product_groups[page_product_name] = []
-                
-                card_data = {
-                    'item_code': row[0],
-                    'product_name': row[2],
-                    'color': row[3],
-                }
-                product_groups[page_product_name].append(card_data)
-
-        # ページデータを作成
-        for page_name, cards in product_groups.items():
-            page_data.append((page_name, cards))
+        # （page_stream を渡すとカード生成と並行して、カードが揃ったページから配置画面に出す）
+        page_data = group_pages(data_rows) if page_stream is None else None
 
         # CardPlacementInterfaceを使用してページを生成
         interface = CardPlacementInterface(page_data=page_data,
                                            card_dir=card_dir,
-                                           page_output_dir=a4_output_dir)
+                                           page_output_dir=a4_output_dir,
+                                           page_manifest=self.page_manifest,
+                                           card_store=self.card_store,
+                                           encoder=self.encoder,
+                                           timing=self.timing,
+                                           journal=self.journal,
+                                           page_stream=page_stream,
+                                           hash_content=self.hash_content)
         interface.main()
+        if page_stream is not None:
+            # カード生成が途中で止まっていれば、その例外を出す
+            page_stream.check()
+            # 途中で画面を閉じた場合も、CSVのページ順で返す
+            interface.sort_log()
         return interface.log_data
 
     def process_csv(self):
@@ -772,20 +714,13 @@ class PageCreator:
             print("CSVファイルが選択されませんでした。")
             return []
 
-        # エンコーディング自動検出
-        encoding = detect_encoding(csv_path)
-        if not encoding:
-            encoding = 'shift_jis'  # フォールバック
-
-        # CSVを読み込み
+        # CSVを読み込み（エンコーディングは先頭から自動検出）
         rows = []
-        with open(csv_path, 'r', encoding=encoding) as f:
-            reader = csv.reader(f)
-            header = next(reader)
-            if len(header) < 8 or header[7] != "ステータス":
-                header.extend(["ステータス", "エラーログ"])
-            rows.append(header)
-            data_rows = list(reader)
+        header, data_rows = read_csv(csv_path)
+        if len(header) < 8 or header[7] != "ステータス":
+            header.extend(["ステータス", "エラーログ"])
+        rows.append(header)
+        data_rows = list(data_rows)
 
         # CardPlacementInterfaceを使用してページを生成
         interface = CardPlacementInterface()
@@ -794,13 +729,8 @@ class PageCreator:
         # 処理結果を返す（空のリストでも返す）
         return rows + data_rows
 
-def detect_encoding(file_path):
-    with open(file_path, 'rb') as f:
-        raw_data = f.read()
-    result = chardet.detect(raw_data)
-    return result['encoding']
-
 def main():
+    configure_fonts(load_settings().get("font_dirs") or None)
     interface = CardPlacementInterface()
     interface.main()
 
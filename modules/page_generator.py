@@ -0,0 +1,111 @@
+import os
+import threading
+from PIL import Image, ImageDraw
+from .fonts import font_registry
+from .card_layouts import CardLayoutManager, select_layout
+
+def safe_page_name(page_name):
+    """ファイル名に使えない文字を全角に置換したページ名を返す"""
+    return (page_name.replace('/', '／').replace('\\', '＼').replace(':', '：')
+            .replace('*', '＊').replace('?', '？').replace('"', "'")
+            .replace('<', '＜').replace('>', '＞').replace('|', '｜'))
+
+def card_image_path(card_dir, item_code, product_name, color_jp, size, ext=".png"):
+    """カード画像の保存パスを返す（カード生成・ページ生成で共通、ext は保存形式の拡張子）"""
+    return os.path.join(card_dir, f"{item_code}-{product_name}_{color_jp}_{'full' if size == 'full' else 'half'}{ext}")
+
+def open_card_image(image_path, card_store=None):
+    """カード画像をカードストア（メモリ）から、無ければファイルから開く（どちらにも無ければ None）"""
+    if card_store is not None:
+        image = card_store.get(image_path)
+        if image is not None:
+            return image
+    if os.path.exists(image_path):
+        return Image.open(image_path)
+    return None
+
+# 描画済みのページの下地（ヘッダー枠と固定の文言）。(ページ寸法・DPI・ヘッダー設定) ごとにプロセス内で1枚だけ作る
+_page_templates = {}
+_page_templates_lock = threading.Lock()
+
+class A4PageGenerator:
+    def __init__(self):
+        # A4サイズ（300dpi、横）
+        self.dpi = 300
+        self.a4_width = 3508
+        self.a4_height = 2480
+        
+        # ヘッダーサイズ
+        self.header_width = 3408
+        self.header_height = 270
+        
+        # ヘッダーの位置（中央寄せ）
+        self.header_x = int((self.a4_width - self.header_width) / 2)  # 50px
+        self.header_y = 60
+        self.header_border_width = 10
+        
+        # フォントサイズ（20pt = 86px @ 300dpi）
+        self.header_font_size = 86
+
+        # ヘッダーのフォント（プロセス共通のレジストリから取得、ページごとには読み込まない）
+        registry = font_registry()
+        self.header_font_file = "".join(registry.font_files(("header",)))
+        self.header_font = registry.font("header", self.header_font_size)
+
+    def template_key(self):
+        """ページの下地のキャッシュキー（寸法・DPI・ヘッダーの設定）"""
+        return (self.a4_width, self.a4_height, self.dpi,
+                self.header_x, self.header_y, self.header_width, self.header_height,
+                self.header_border_width, self.header_font_file, self.header_font_size)
+
+    def page_template(self):
+        """ヘッダー枠と「他バリエーションはこちら」を描画済みのページの下地（共有するので書き換えない）"""
+        key = self.template_key()
+        with _page_templates_lock:
+            template = _page_templates.get(key)
+            if template is None:
+                template = self._render_template()
+                _page_templates[key] = template
+            return template
+
+    def _render_template(self):
+        page = Image.new('RGB', (self.a4_width, self.a4_height), 'white')
+        draw = ImageDraw.Draw(page)
+
+        # ヘッダー
+        draw.rectangle(
+            (self.header_x, self.header_y, 
+             self.header_x + self.header_width, self.header_y + self.header_height),
+            outline='black', width=self.header_border_width
+        )
+
+        # 他バリエーションはこちら（左揃え）
+        draw.text((self.header_x + 50, self.header_y + self.header_height/2), 
+                  "他バリエーションはこちら", font=self.header_font, fill='black', anchor="lm")
+        return page
+
+    def create_a4_page(self, cards, page_product_name):
+        # 描画済みの下地をコピーし、ページごとに変わる商品名とカードだけを描く
+        page = self.page_template().copy()
+        draw = ImageDraw.Draw(page)
+
+        # 商品名（右揃え）
+        draw.text((self.header_x + self.header_width - 50, self.header_y + self.header_height/2), 
+                  f"商品名：{page_product_name}", font=self.header_font, fill='black', anchor="rm")
+
+        # カード配置
+        for card_info in cards:
+            card_img = card_info['image']
+            x = card_info['x']
+            y = card_info['y']
+            page.paste(card_img, (x, y))
+
+        return page
+
+    def calculate_positions_and_sizes(self, num_cards):
+        """枚数に対応する先頭の配置パターンの (位置のリスト, サイズのリスト)（配置は CardLayoutManager で計算）"""
+        layout_manager = CardLayoutManager(self.a4_width, self.a4_height)
+        _, layout = select_layout(layout_manager.get_layouts_for_count(num_cards))
+        if layout is None:
+            return [], []
+        return list(layout.positions), list(layout.sizes)
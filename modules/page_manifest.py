@@ -0,0 +1,64 @@
+import os
+import json
+import hashlib
+from .render_cache import file_fingerprint, tagged_filename
+
+PAGE_MANIFEST_FILENAME = ".page_manifest.json"
+
+def generator_fingerprint(page_generator):
+    """ページの見た目に影響する A4PageGenerator の設定値のハッシュ"""
+    params = sorted((k, v) for k, v in vars(page_generator).items() if isinstance(v, (int, float, str)))
+    return hashlib.sha256(json.dumps(params).encode('utf-8')).hexdigest()
+
+class PageManifest:
+    """A4ページごとの構成（パターン・カード順・カード画像のハッシュ）を記録し、
+    変更のないページの再生成を省く
+
+    page_output_dir/.page_manifest.json に {ページ名: エントリ} を保存する（tag を渡すと .page_manifest.<tag>.json）。
+    """
+
+    def __init__(self, page_output_dir, hash_content=False, tag=None):
+        self.path = os.path.join(page_output_dir, tagged_filename(PAGE_MANIFEST_FILENAME, tag))
+        self.hash_content = hash_content
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"ページマニフェストを読み込めませんでした（作り直します）: {e}")
+
+    def page_entry(self, page_name, pattern_id, card_paths, page_generator):
+        """ページのエントリを作る（card_paths はカード画像パスのリスト、配置順）"""
+        return {
+            "page_name": page_name,
+            "pattern": pattern_id,
+            "cards": [[os.path.basename(path), file_fingerprint(path, self.hash_content)] for path in card_paths],
+            "generator": generator_fingerprint(page_generator),
+        }
+
+    def is_fresh(self, page_name, entry, output_path, changed=False):
+        """前回と同じ構成でページが残っていれば True（changed=True なら常に作り直す）"""
+        fresh = (
+            not changed
+            and all(fingerprint is not None for _, fingerprint in entry["cards"])
+            and self.entries.get(page_name) == entry
+            and os.path.exists(output_path)
+        )
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def update(self, page_name, entry):
+        self.entries[page_name] = entry
+
+    def save(self):
+        # 途中で落ちても壊れないよう一時ファイルから置き換える
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
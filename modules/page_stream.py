@@ -0,0 +1,81 @@
+import queue
+import threading
+from collections import Counter
+from .card_layouts import CardLayoutManager
+from .page_batch import split_page
+
+def count_page_rows(rows):
+    """ページ商品名ごとの行数（行そのものは保持しないので、CSVを先に数えるだけならメモリを使わない）"""
+    return Counter(row[5] for row in rows if len(row) >= 6)
+
+class PageStream:
+    """カード生成と並行して、カードが揃ったページから順に流すキュー
+
+    page_counts（ページ商品名 -> 行数）を先に数えておき、読んだ行を add_row() で、カード生成が
+    終わった行を card_done() で受け取る。ページ商品名の全行が終わったら、そのページ（split_page で
+    分けたページを含む）を queue に入れる。カード生成が終わったら close() で残りのページと
+    終わりの印（None）を入れる。カード生成が例外で止まった場合は、ページ生成側が check() で同じ例外を出す。
+    ページはカードが揃った順に流れるので、ログをCSVのページ順に戻すときは page_order() をキーにする。
+    """
+
+    def __init__(self, page_counts):
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._layout_manager = CardLayoutManager()
+        self._totals = Counter(page_counts)
+        self._finished = Counter()
+        self._cards = {}  # ページ商品名 -> カード（読んだ順、まだ流していないもの）
+        self._order = {}  # ページ商品名 -> CSVに出てきた順番
+        self._page_keys = {}  # 流したページ名 -> (CSVのページ順, 分けたページの順)
+        self.error = None  # カード生成を止めた例外
+
+    def add_row(self, row, pending=True):
+        """CSVの順番で読んだ行を受け取る（pending=False はカード生成を待たない行、--retry-failures で再処理しない行など）"""
+        if len(row) < 6:
+            return
+        with self._lock:
+            self._order.setdefault(row[5], len(self._order))
+            self._cards.setdefault(row[5], []).append({
+                'item_code': row[0],
+                'product_name': row[2],
+                'color': row[3],
+            })
+            if not pending:
+                self._finish(row[5])
+
+    def card_done(self, row):
+        """行のカード生成が終わった（スキップ・エラーを含む）"""
+        if len(row) < 6:
+            return
+        with self._lock:
+            self._finish(row[5])
+
+    def close(self, error=None):
+        """カード生成の終わり（error で止まった場合も、残りのページを流してから終わりの印を入れる）"""
+        with self._lock:
+            self.error = error
+            for page_name in list(self._cards):
+                self._release(page_name)
+            self.queue.put(None)
+
+    def check(self):
+        """カード生成が例外で止まっていれば、その例外を出す（ページ生成の結果をまとめる前に呼ぶ）"""
+        if self.error is not None:
+            raise self.error
+
+    def page_order(self, page_name):
+        """流したページ名の、CSVのページ順（group_pages と同じ順）での並べ替えキー"""
+        with self._lock:
+            return self._page_keys.get(page_name, (len(self._order), 0))
+
+    def _finish(self, page_name):
+        self._finished[page_name] += 1
+        if self._finished[page_name] >= self._totals[page_name]:
+            self._release(page_name)
+
+    def _release(self, page_name):
+        cards = self._cards.pop(page_name, None)
+        if cards:
+            for index, page in enumerate(split_page(page_name, cards, self._layout_manager)):
+                self._page_keys[page[0]] = (self._order[page_name], index)
+                self.queue.put(page)
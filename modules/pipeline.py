@@ -0,0 +1,88 @@
+import sys
+from collections import deque
+
+def bounded_map(executor, fn, items, max_in_flight, chunksize=1):
+    """executor.map と同じく結果を入力順に返すが、投入済みで未回収の入力を max_in_flight 件までに抑える
+
+    executor.map は入力を最後まで読んで全件を一度に投入するため、結果（カード画像など）が
+    回収されるまでメモリに溜まる。こちらは結果を1つ回収するごとに次の入力を読んで投入するので、
+    消費側が遅ければ入力の読み込み・先読みも止まる（バックプレッシャー）。
+
+    デコード・描画・エンコード・保存の段階ごとにキューを置く代わりに、1行（1ページ）の全段階を
+    1つのワーカーで続けて処理し、その単位で投入数を抑えている。段階の間でキューを挟むと
+    フルサイズの画像がプロセス間を行き来して（pickle）、分ける利点より転送の負担が大きいため。
+    ワーカー内のエンコード・保存は encode_workers 本のスレッドに限られ、保存が終わるまで行の結果を
+    返さないので、この上限で全段階の作業中の画像の数も抑えられる。
+    """
+    chunksize = max(1, min(chunksize, max_in_flight))
+    max_chunks = max(1, max_in_flight // chunksize)
+    pending = deque()
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) < chunksize:
+            continue
+        pending.append(executor.submit(_call_chunk, fn, chunk))
+        chunk = []
+        while len(pending) >= max_chunks:
+            yield from pending.popleft().result()
+    if chunk:
+        pending.append(executor.submit(_call_chunk, fn, chunk))
+    while pending:
+        yield from pending.popleft().result()
+
+def process_pool(workers, initializer=None, initargs=()):
+    """ワーカープロセスのプールを spawn で作る（Windows と同じ起動方法）
+
+    カード生成とページ生成を並行させると、別のスレッドが動いている親プロセスからプールを作ることになる。
+    fork ではそのスレッドが持っていたロック（import のロックなど）ごと子プロセスに写り、ワーカーが
+    止まったままになることがあるので、ワーカーは新しいプロセスとして起動する。
+    """
+    # multiprocessing はワーカー側では使わないので、プールを作る親プロセスでだけ読み込む
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+def _call_chunk(fn, chunk):
+    # ワーカーで実行される（プロセス間のやり取りをチャンク単位にまとめる）
+    return [fn(item) for item in chunk]
+
+def peak_rss_bytes():
+    """このプロセスのピーク常駐メモリ（バイト、取得できなければ None）"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux はKB単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def format_peak_rss(parent_bytes, stages):
+    """ピークメモリの表示（stages は [(段階名, {pid: ピークバイト数}), ...]）"""
+    def mb(nbytes):
+        return f"{nbytes / 1024 / 1024:.0f}MB"
+
+    parts = [f"親プロセス {mb(parent_bytes)}" if parent_bytes is not None else "親プロセス 不明"]
+    for name, peaks in stages:
+        peaks = [peak for peak in peaks.values() if peak is not None]
+        if peaks:
+            parts.append(f"{name}ワーカー 最大 {mb(max(peaks))} / {len(peaks)}プロセス合計 {mb(sum(peaks))}")
+    return " / ".join(parts)
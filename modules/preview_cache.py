@@ -0,0 +1,101 @@
+import os
+from collections import OrderedDict
+from PIL import Image
+
+# プレビュー用サムネイルの縮尺（大きい順、前の段から順に縮小して作る）
+PREVIEW_SCALES = (0.4, 0.2, 0.1)
+PREVIEW_DIRNAME = ".preview"
+
+def preview_path(card_path, scale):
+    """カード画像に対応するサムネイルの保存パス（card_dir/.preview/040/xxx.png など）"""
+    return os.path.join(os.path.dirname(card_path), PREVIEW_DIRNAME, f"{int(round(scale * 100)):03d}",
+                        os.path.basename(card_path))
+
+def build_previews(card, scales=PREVIEW_SCALES):
+    """カード画像から各縮尺のサムネイルを作る（{縮尺: 画像}）"""
+    previews = {}
+    source = card
+    for scale in sorted(scales, reverse=True):
+        size = (max(1, int(card.width * scale)), max(1, int(card.height * scale)))
+        source = source.resize(size, Image.Resampling.LANCZOS)
+        previews[scale] = source
+    return previews
+
+def save_previews(card_path, card, scales=PREVIEW_SCALES):
+    previews = build_previews(card, scales)
+    for scale, preview in previews.items():
+        path = preview_path(card_path, scale)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        preview.save(path, compress_level=1)
+    return previews
+
+def _load_image(path):
+    # 読み込んでからファイルを閉じる（プレビューは多数開くので、ファイルを開いたままにしない）
+    with Image.open(path) as image:
+        image.load()
+    return image
+
+class PreviewCache:
+    """配置画面のプレビュー用に、表示サイズへ縮小済みのカード画像を保持する
+
+    保存済みのサムネイルのうち表示倍率以上で最も小さいものを縮小して使い、サムネイルが無い（古い）場合は
+    元のカード画像から作って保存しておく（create_all.py のカード生成ではサムネイルを書き出さない）。
+    """
+
+    def __init__(self, card_store=None, scales=PREVIEW_SCALES, max_entries=2048):
+        self.card_store = card_store
+        self.scales = tuple(sorted(scales))
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (card_path, 表示サイズ) -> image
+        self.hits = 0
+        self.misses = 0
+
+    def _load_source(self, card_path, scale):
+        # 今回生成したメモリ上のカードはサムネイルより新しいので、そのまま使う
+        if self.card_store is not None:
+            card = self.card_store.get(card_path)
+            if card is not None:
+                return card
+        if not os.path.exists(card_path):
+            # カードが無ければ、残っているサムネイルも古いかもしれないので使わない
+            return None
+        # 表示倍率以上で最も小さいサムネイル（カードより新しいもの）を探す
+        card_mtime = os.path.getmtime(card_path)
+        for level in self.scales:
+            if level < scale:
+                continue
+            path = preview_path(card_path, level)
+            if os.path.exists(path) and os.path.getmtime(path) >= card_mtime:
+                return _load_image(path)
+        # サムネイルが無ければカード画像から作り、次に表示するときのために書き出しておく
+        card = _load_image(card_path)
+        previews = save_previews(card_path, card, self.scales)
+        return min((previews[level] for level in previews if level >= scale), key=lambda image: image.width,
+                   default=card)
+
+    def get(self, card_path, scale, card_size):
+        """card_size（元カードの幅・高さ）を scale 倍した表示用画像を返す（無ければ None）"""
+        display_size = (int(card_size[0] * scale), int(card_size[1] * scale))
+        key = (card_path, display_size)
+        image = self._entries.get(key)
+        if image is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        source = self._load_source(card_path, scale)
+        if source is None:
+            return None
+        image = source.resize(display_size, Image.Resampling.LANCZOS)
+        self._entries[key] = image
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return image
+
+    def invalidate(self, card_path=None):
+        if card_path is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if key[0] == card_path]:
+            del self._entries[key]
@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+
+RENDER_CACHE_FILENAME = ".render_cache.json"
+
+def tagged_filename(filename, tag=None):
+    """".render_cache.json" -> ".render_cache.<tag>.json"（tag が無ければそのまま）"""
+    if not tag:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{tag}{ext}"
+
+def file_fingerprint(path, hash_content=False):
+    """ファイルの同一性を表す値を返す（既定はサイズ+更新日時、指定時は内容のハッシュ）"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not hash_content:
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class RenderCache:
+    """カード画像の入力ハッシュを記録し、入力が変わっていないカードの再生成を省く
+
+    output_dir/.render_cache.json に {カード名: キー} を保存する。
+    tag（シャード名など）を渡すと .render_cache.<tag>.json を使い、同じ出力先を使う他の実行と分ける。
+    """
+
+    def __init__(self, output_dir, hash_content=False, tag=None):
+        self.path = os.path.join(output_dir, tagged_filename(RENDER_CACHE_FILENAME, tag))
+        self.hash_content = hash_content
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"レンダーキャッシュを読み込めませんでした（作り直します）: {e}")
+
+    def card_key(self, generator_fingerprint, image_path, item_code, product_name, color_jp, color_en):
+        """カードの見た目に影響する全入力からキーを作る（元画像が無ければNone）"""
+        image_fingerprint = file_fingerprint(image_path, self.hash_content)
+        if image_fingerprint is None:
+            return None
+        payload = json.dumps(
+            [generator_fingerprint, image_path, image_fingerprint, item_code, product_name, color_jp, color_en],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_fresh(self, name, key, output_paths):
+        fresh = key is not None and self.entries.get(name) == key and all(os.path.exists(p) for p in output_paths)
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def update(self, name, key):
+        if key is not None:
+            self.entries[name] = key
+
+    def save(self):
+        # 途中で落ちても壊れないよう一時ファイルから置き換える
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
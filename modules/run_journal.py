@@ -0,0 +1,97 @@
+import os
+import json
+import threading
+from .render_cache import tagged_filename
+
+RUN_JOURNAL_FILENAME = ".run_journal.jsonl"
+
+class RunJournal:
+    """完了したカード・ページを1件ずつ追記する実行ジャーナル（処理が途中で止まっても完了分の記録は残る）
+
+    output_dir/.run_journal.jsonl に1行1JSONで追記する。resume=True なら前回の記録を読み込み、
+    正常に終わっていて出力ファイルが残っているカード・ページを finished_card() / finished_page() で返す。
+    resume=False なら記録を作り直す。tag（シャード名など）を渡すと .run_journal.<tag>.jsonl を使う。
+    カード生成とページ生成を並行させるときは別スレッドから記録されるので、書き込みはロックで守る。
+    """
+
+    def __init__(self, output_dir, resume=False, tag=None):
+        self.path = os.path.join(output_dir, tagged_filename(RUN_JOURNAL_FILENAME, tag))
+        self.cards = {}  # 行の内容（JSON） -> {"result": ログ行, "outputs": [カード画像パス]}
+        self.pages = {}  # ページ名 -> {"entry": ログの辞書, "cards": [カード画像パス], "output": ページ画像パス}
+        self.changed_outputs = set()  # 今回生成したカード画像（これを含むページは作り直す）
+        self.resumed_cards = 0
+        self.resumed_pages = 0
+        if resume and os.path.exists(self.path):
+            self._load()
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 書き込み途中で止まった最後の行は読み飛ばす
+                    continue
+                if record.get("type") == "card":
+                    self.cards[_row_key(record["row"])] = record
+                elif record.get("type") == "page":
+                    self.pages[record["entry"]["page_name"]] = record
+
+    def _write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def finished_card(self, row, output_paths):
+        """前回正常に終わっていて、カード画像が残っている行のログ行（無ければ None）"""
+        record = self.cards.get(_row_key(row))
+        if (record is None or record["result"][-2] != "正常" or record["outputs"] != list(output_paths)
+                or not all(os.path.exists(path) for path in output_paths)):
+            return None
+        self.resumed_cards += 1
+        return list(record["result"])
+
+    def record_card(self, row, result, output_paths, rendered=True):
+        """完了した行を記録する（rendered=False はキャッシュなどで今回は描画しなかった行）"""
+        record = {"type": "card", "row": list(row), "result": list(result), "outputs": list(output_paths)}
+        with self._lock:
+            if rendered:
+                self.changed_outputs.update(output_paths)
+            self.cards[_row_key(row)] = record
+        self._write(record)
+
+    def finished_page(self, page_name, output_path, card_paths=None):
+        """前回正常に終わっていて、ページ画像が残っているページのログの辞書（無ければ None）
+
+        今回作り直したカードを含むページは作り直す。card_paths を渡すとカードの構成が前回と同じ場合だけ返す。
+        """
+        record = self.pages.get(page_name)
+        if record is None or record["entry"]["status"] != "正常" or record["output"] != output_path:
+            return None
+        if card_paths is not None and record["cards"] != list(card_paths):
+            return None
+        with self._lock:
+            if self.changed_outputs.intersection(record["cards"]):
+                return None
+        if not os.path.exists(output_path):
+            return None
+        self.resumed_pages += 1
+        return dict(record["entry"])
+
+    def record_page(self, entry, output_path, card_paths=()):
+        # 計測結果（timings）はジャーナルに残さない
+        entry = {key: value for key, value in entry.items() if key != "timings"}
+        record = {"type": "page", "entry": entry, "cards": list(card_paths), "output": output_path}
+        self.pages[entry["page_name"]] = record
+        self._write(record)
+
+    def close(self):
+        self._file.close()
+        if self.resumed_cards or self.resumed_pages:
+            print(f"実行ジャーナル: 前回完了分を再利用 カード {self.resumed_cards}行 / ページ {self.resumed_pages}")
+
+def _row_key(row):
+    return json.dumps(list(row), ensure_ascii=False)
@@ -0,0 +1,34 @@
+import os
+import csv
+from .csv_source import read_csv
+
+CARD_LOG_SUFFIX = "_card_create_log.csv"
+PAGE_LOG_SUFFIX = "_page_create_log.csv"
+PAGE_LOG_HEADER = ["ページ名", "ステータス", "ログ", "カード枚数"]
+
+def write_log(log_path, rows):
+    """ログをCSV（shift-jis）で保存する（rows はヘッダー行を含む）"""
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    with open(log_path, 'w', encoding='shift_jis', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerows(rows)
+
+def page_log_rows(entries):
+    """ページ生成の結果（辞書のリスト）をページ作成ログの行にする"""
+    return [[entry["page_name"], entry["status"], entry["log"], entry["card_count"]] for entry in entries]
+
+def read_card_log(log_path):
+    """カード作成ログを (ヘッダー, ログ行のリスト) で読み込む（各行の末尾2列がステータス・エラーログ）"""
+    header, rows = read_csv(log_path)
+    return header, list(rows)
+
+def failed_card_indices(log_rows):
+    """カード作成ログでステータスがエラーの行の位置"""
+    return [index for index, row in enumerate(log_rows) if len(row) >= 2 and row[-2] == "エラー"]
+
+def merge_retried(log_rows, indices, results):
+    """前回のログ行のうち indices の行を再処理の結果 results（同じ順番）で置き換えたログ行を返す"""
+    merged = list(log_rows)
+    for index, result in zip(indices, results):
+        merged[index] = result
+    return merged
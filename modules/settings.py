@@ -0,0 +1,27 @@
+import os
+import json
+
+# リポジトリ直下の settings.json
+DEFAULT_SETTINGS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "settings.json")
+
+DEFAULT_SETTINGS = {
+    "image_format": "png",
+    "png_compress_level": 6,
+    "jpeg_quality": 90,
+    "webp_quality": 90,
+    "webp_method": 4,
+    "card_palette_colors": 0,
+    "encode_workers": 2,
+    "font_dirs": [],
+}
+
+def load_settings(path=None):
+    """settings.json を読み込み、未指定の項目は既定値で補う"""
+    path = path or DEFAULT_SETTINGS_PATH
+    settings = dict(DEFAULT_SETTINGS)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    else:
+        print(f"設定ファイルが見つからないため既定値を使用します: {path}")
+    return settings
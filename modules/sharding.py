@@ -0,0 +1,88 @@
+import os
+import re
+import zlib
+from .csv_source import read_csv
+from .run_logs import CARD_LOG_SUFFIX, PAGE_LOG_SUFFIX, write_log
+
+# シャードのログの1列目（元のCSVでのデータ行番号、1始まり）
+ROW_NUMBER_COLUMN = "行番号"
+
+# <日時>_shard<i>of<N>_card_create_log.csv など
+SHARD_LOG_PATTERN = re.compile(r"^(\d{14})_shard(\d+)of(\d+)(_card_create_log\.csv|_page_create_log\.csv)$")
+
+def parse_shard(text):
+    """"2/4" を (2, 4)（4分割の2番目、1始まり）にする"""
+    index, _, count = text.partition("/")
+    index, count = int(index), int(count or 0)
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"シャードの指定が正しくありません: {text}（例: 2/4）")
+    return index, count
+
+def shard_tag(shard):
+    """ログ・キャッシュのファイル名に付けるシャード名（"shard2of4"）"""
+    return f"shard{shard[0]}of{shard[1]}"
+
+def shard_of(page_product_name, count):
+    """ページ商品名が属するシャード（1始まり、どのマシンでも同じ結果になるよう CRC32 で分ける）"""
+    return zlib.crc32(page_product_name.encode('utf-8')) % count + 1
+
+def row_in_shard(row, shard):
+    """行がシャードに属するか（ページ商品名ごとに分けるので、1つのページが複数のシャードにまたがらない）"""
+    page_product_name = row[5] if len(row) >= 6 else ""
+    return shard_of(page_product_name, shard[1]) == shard[0]
+
+def page_row_numbers(data_rows, row_numbers):
+    """ページ名 -> そのページ商品名が最初に現れる行番号（分けたページは元のページ商品名で探す）"""
+    first_rows = {}
+    for row, row_number in zip(data_rows, row_numbers):
+        if len(row) >= 6:
+            first_rows.setdefault(row[5], row_number)
+
+    def row_number_of(page_name):
+        from .page_batch import base_page_name
+        return first_rows.get(page_name, first_rows.get(base_page_name(page_name), 0))
+    return row_number_of
+
+def find_shard_logs(log_dir):
+    """log_dir のシャードのログを {(シャード数, ログの種類): {シャード番号: パス}} で返す（同じシャードは新しいもの）"""
+    found = {}
+    for filename in sorted(os.listdir(log_dir)):
+        match = SHARD_LOG_PATTERN.match(filename)
+        if match:
+            _, index, count, suffix = match.groups()
+            # ファイル名の日時順に見ているので、後のもので上書きすると最新になる
+            found.setdefault((int(count), suffix), {})[int(index)] = os.path.join(log_dir, filename)
+    return found
+
+def merge_shard_logs(log_dir, timestamp, count=None):
+    """シャードごとのカード・ページ作成ログを元の行順で1つにまとめ、(カードログ, ページログ) のパスを返す
+
+    count を省略すると log_dir にある最新のシャードのログのシャード数を使う。
+    """
+    found = find_shard_logs(log_dir)
+    if not found:
+        raise ValueError(f"シャードのログが見つかりません: {log_dir}")
+    if count is None:
+        # ファイル名は日時で始まるので、名前が最大のログが最新
+        newest = max(found, key=lambda key: max(os.path.basename(path) for path in found[key].values()))
+        count = newest[0]
+
+    merged_paths = []
+    for suffix in (CARD_LOG_SUFFIX, PAGE_LOG_SUFFIX):
+        logs = found.get((count, suffix), {})
+        missing = [str(index) for index in range(1, count + 1) if index not in logs]
+        if missing:
+            raise ValueError(f"{count}分割のうちシャード {', '.join(missing)} の{suffix}が見つかりません: {log_dir}")
+        header = None
+        rows = []
+        for index in range(1, count + 1):
+            shard_header, shard_rows = read_csv(logs[index])
+            header = header or shard_header[1:]
+            # (行番号, シャード番号, シャード内の順番) で並べる（分けたページは同じシャードの中の順番を保つ）
+            rows.extend(((int(row[0] or 0), index, position), row[1:]) for position, row in enumerate(shard_rows))
+        rows.sort(key=lambda item: item[0])
+        merged_path = os.path.join(log_dir, f"{timestamp}{suffix}")
+        write_log(merged_path, [header] + [row for _, row in rows])
+        merged_paths.append(merged_path)
+        print(f"{count}シャードのログをまとめました: {merged_path}（{len(rows)}行）")
+    return tuple(merged_paths)
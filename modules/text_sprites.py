@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from PIL import Image
+
+class TextSpriteCache:
+    """縁取り付きテキストのマスク（縁取り・文字本体）をラスタライズ済みで保持するLRUキャッシュ
+
+    ImageDraw.text と同じく getmask2 のマスクを draw.bitmap で塗るため、
+    描画結果は draw.text(..., stroke_width, stroke_fill) とピクセル単位で一致する。
+    """
+
+    def __init__(self, max_entries=4096, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (sprites, nbytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _render(self, text, font, stroke_width, anchor):
+        # [(マスク, オフセット), ...] を縁取り→文字本体の順で返す（ImageDraw.text と同じ順番）
+        sprites = []
+        for width in ((stroke_width, 0) if stroke_width else (0,)):
+            mask, offset = font.getmask2(text, "L", stroke_width=width, anchor=anchor, start=(0, 0))
+            sprites.append((Image.Image()._new(mask), offset))
+        return sprites
+
+    def get(self, text, font_key, font, stroke_width=0, anchor="mm"):
+        key = (text, font_key, stroke_width, anchor)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        sprites = self._render(text, font, stroke_width, anchor)
+        nbytes = sum(mask.width * mask.height for mask, _ in sprites)
+        if nbytes <= self.max_bytes:
+            self._entries[key] = (sprites, nbytes)
+            self.current_bytes += nbytes
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+        return sprites
+
+    def draw(self, draw, xy, text, font_key, font, fill, stroke_width=0, stroke_fill=None, anchor="mm"):
+        """draw.text(xy, text, font=font, fill=fill, stroke_width=..., stroke_fill=..., anchor=...) の代わり"""
+        if not text or not hasattr(font, "getmask2"):
+            draw.text(xy, text, font=font, fill=fill, stroke_width=stroke_width,
+                      stroke_fill=stroke_fill, anchor=anchor)
+            return
+
+        sprites = self.get(text, font_key, font, stroke_width, anchor)
+        inks = (stroke_fill if stroke_fill is not None else fill, fill) if stroke_width else (fill,)
+        x, y = int(xy[0]), int(xy[1])
+        for (mask, offset), ink in zip(sprites, inks):
+            draw.bitmap((x + offset[0], y + offset[1]), mask, fill=ink)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
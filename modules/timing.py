@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+class RowTimer:
+    """1行（1ページ）分の段階ごとの所要時間を集める（保存スレッドからも加算できる）"""
+
+    def __init__(self):
+        self.durations = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        """{段階: ミリ秒}"""
+        with self._lock:
+            return {name: round(seconds * 1000, 3) for name, seconds in self.durations.items()}
+
+def timed(timer, name):
+    """timer が None なら何もしないコンテキスト"""
+    return timer.stage(name) if timer is not None else nullcontext()
+
+def parse_row_range(text):
+    """"120:130" や "120" を (開始, 終了)（1始まり・両端含む）にする"""
+    start, _, end = text.partition(":")
+    start = int(start)
+    end = int(end) if end else start
+    if start < 1 or end < start:
+        raise ValueError(f"行の範囲が正しくありません: {text}")
+    return start, end
+
+class Instrumentation:
+    """行ごとの計測設定（ワーカープロセスにもそのまま渡す）
+
+    timing=True なら段階ごとの時間を記録し、profile_rows（データ行番号、1始まり）の範囲の行は
+    cProfile と tracemalloc で計測して profile_dir に書き出す。
+    """
+
+    def __init__(self, timing=True, profile_rows=None, profile_dir="profile"):
+        self.timing = timing
+        self.profile_rows = profile_rows
+        self.profile_dir = profile_dir
+
+    def new_timer(self):
+        return RowTimer() if self.timing else None
+
+    def wants_profile(self, row_number):
+        return self.profile_rows is not None and self.profile_rows[0] <= row_number <= self.profile_rows[1]
+
+    def profile(self, label, fn, *args, **kwargs):
+        """fn を cProfile・tracemalloc 付きで実行し、(戻り値, 概要) を返す"""
+        # プロファイラは計測する行があるときだけ読み込む（ワーカーの起動を遅くしない）
+        import io
+        import pstats
+        import cProfile
+        import tracemalloc
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profiler = cProfile.Profile()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profiler.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if not tracing:
+                tracemalloc.stop()
+
+        prof_path = os.path.join(self.profile_dir, f"{label}.prof")
+        profiler.dump_stats(prof_path)
+        report_path = os.path.join(self.profile_dir, f"{label}.txt")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(30)
+            f.write(stream.getvalue())
+            f.write("\n# メモリ確保（増加量の多い順）\n")
+            for stat in after.compare_to(before, "lineno")[:20]:
+                f.write(f"{stat}\n")
+        print(f"プロファイルを保存しました: {prof_path}")
+        return result, {"prof": prof_path, "report": report_path, "peak_kb": round(peak / 1024)}
+
+class TimingLog:
+    """行・ページごとの計測結果を1行1JSONで書き出すログ（処理が止まっても途中まで読める）"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def write_card(self, index, result, timings=None, cached=False):
+        """カード作成ログの1行分（index は0始まりのデータ行番号）"""
+        timings = timings or {}
+        record = {
+            "row": index + 1,
+            "item_code": result[0] if result else "",
+            "image_path": result[1] if len(result) > 1 else "",
+            "status": result[-2],
+            "cached": cached,
+            "ms": timings.get("ms", {}),
+            "wall_ms": timings.get("wall_ms", 0.0),
+        }
+        if "profile" in timings:
+            record["profile"] = timings["profile"]
+        self.write(record)
+
+    def write_page(self, entry):
+        timings = entry.get("timings", {})
+        self.write({
+            "page_name": entry["page_name"],
+            "status": entry["status"],
+            "card_count": entry["card_count"],
+            "ms": timings,
+            "total_ms": round(sum(timings.values()), 3),
+        })
+
+    def close(self):
+        self._file.close()
+        print(f"計測ログを保存しました: {self.path}")